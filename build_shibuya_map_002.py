@@ -10,73 +10,212 @@ This is the SAME pipeline used by Isometric NYC:
   Real data → Parse → Transform → Render isometrically
 """
 
-import xml.etree.ElementTree as ET
 import math
 import json
+import os
+import sys
+from array import array
+
+# lxml parses with libxml2, which is several times faster than the stdlib
+# parser on big OSM exports. It's optional — without it we fall back to
+# the standard library and everything still works.
+try:
+    from lxml import etree as ET
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAVE_LXML = False
+
+# Same idea for the JSON we embed in the page: orjson is a lot faster than
+# the stdlib encoder, but the script doesn't need it.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # === STEP 1: PARSE THE OSM FILE ===
+# Stream the file with iterparse instead of loading the whole XML tree:
+# every <node> and <way> is handled the moment its closing tag is read,
+# then cleared so memory stays flat no matter how big the export is.
+# OSM files list all nodes before any ways, so by the time we see a way
+# every node it references is already in the lookup.
 print("Step 1: Parsing OSM file...")
 
 osm_file = "/home/kenta/Downloads/Shibuya Crossing Map.osm"
-tree = ET.parse(osm_file)
-root = tree.getroot()
+output_file = "/home/kenta/coding-tutor-tutorials/shibuya_osm.html"
+
+# PLATEAU (Step 2a) replaces OSM's building footprints when it's available,
+# so check for it up front and skip work on OSM outlines we'd throw away
+plateau_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "plateau_data", "shibuya_crossing_buildings.json")
+have_plateau = os.path.exists(plateau_path)
+
+def iter_osm_elements(path):
+    """Yield each <node> and <way> once fully parsed, then free it."""
+    if HAVE_LXML:
+        # No tag filter: lxml would still build the filtered-out <relation>
+        # elements into the tree, and nothing would ever free them
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag in ("node", "way"):
+                yield elem
+            elif elem.tag != "relation":
+                continue  # <tag>/<nd>/<member> children go with their parent
+            elem.clear()
+            # Drop the already-processed siblings still attached to <osm>
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    else:
+        context = ET.iterparse(path, events=("start", "end"))
+        _, root = next(context)  # Grab the <osm> root so we can drop finished children
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag in ("node", "way"):
+                yield elem
+            elif elem.tag != "relation":
+                continue  # <tag>/<nd> children are cleared along with their parent
+            # Done with this element — free it and everything parsed before it
+            root.clear()
 
 # Build a lookup of all nodes: node_id -> (lat, lon)
 # This is like building a dictionary — same as your city builder!
-nodes = {}
-for node in root.findall("node"):
-    node_id = node.get("id")
-    lat = float(node.get("lat"))
-    lon = float(node.get("lon"))
-    nodes[node_id] = {"lat": lat, "lon": lon}
-
-print(f"  Found {len(nodes)} nodes (map points)")
+# Instead of one small dict per node, coordinates live in two packed
+# arrays of doubles and the dict only maps the OSM id to a row number.
+# Most nodes are never used by a way we keep, so this saves a lot of memory.
+node_idx = {}         # OSM node id (int) -> row in node_lat/node_lon
+node_lat = array("d")
+node_lon = array("d")
+
+# The only way tags the extraction below ever reads — everything else
+# (addresses, source=*, wikidata, ...) is skipped while scanning
+WAY_TAG_KEYS = frozenset((
+    "building", "building:levels", "name", "name:en",
+    "highway", "lanes", "crossing:scramble", "area", "alt_name:en", "junction",
+))
+
+# Everything we pull out of the ways, filled in the same pass
+osm_building_count = 0
+buildings = []
+roads = []
+scramble_area = None
+scramble_crossings = []
 
-# === STEP 2: EXTRACT BUILDINGS ===
-print("Step 2: Extracting buildings...")
+for elem in iter_osm_elements(osm_file):
+    if elem.tag == "node":
+        node_idx[int(elem.get("id"))] = len(node_lat)
+        node_lat.append(float(elem.get("lat")))
+        node_lon.append(float(elem.get("lon")))
+
+    else:  # <way>
+        tags = {}
+        for tag in elem.iter("tag"):
+            key = tag.get("k")
+            if key in WAY_TAG_KEYS:
+                tags[key] = tag.get("v")
+                if len(tags) == len(WAY_TAG_KEYS):
+                    break
+
+        # Most ways (rivers, boundaries, landuse, ...) are none of the things
+        # we draw — bail out before touching their node references
+        if ("building" not in tags and "highway" not in tags
+                and "Scramble Crossing" not in tags.get("alt_name:en", "")
+                and not (tags.get("area") == "yes" and "junction" in tags)):
+            continue
 
-buildings = []
+        # Get the node references (the way's outline) as rows in the node arrays
+        refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+        idxs = [node_idx[ref] for ref in refs if ref in node_idx]
+
+        # Decide what this way is before building any coordinate dicts
+        highway_type = tags.get("highway")
+        is_building = "building" in tags and len(idxs) >= 3  # Need at least 3 points for a polygon
+        # Skip non-road types
+        is_road = (highway_type is not None and len(idxs) >= 2
+                   and highway_type not in ("bus_stop", "traffic_signals", "crossing"))
+
+        is_scramble = tags.get("crossing:scramble") == "yes"
+        is_area = tags.get("area") == "yes"
+        alt_name = tags.get("alt_name:en", "")
+        # The scramble crossing area polygon
+        is_scramble_area = (len(idxs) >= 3 and
+                            ("Scramble Crossing" in alt_name or (is_area and "junction" in tags)))
+        # Individual crossing lines (the zebra paths)
+        is_crossing = is_scramble and highway_type == "footway" and len(idxs) >= 2
+
+        # With PLATEAU, OSM buildings only lend their names — no outline needed
+        keep_outline = (is_road or is_scramble_area or is_crossing
+                        or (is_building and not have_plateau))
+        if not (is_building or keep_outline):
+            continue
 
-for way in root.findall("way"):
-    tags = {}
-    for tag in way.findall("tag"):
-        tags[tag.get("k")] = tag.get("v")
+        # Outline as plain (lat, lon) tuples — far lighter than a dict per vertex
+        coords = [(node_lat[i], node_lon[i]) for i in idxs] if keep_outline else None
+
+        # Buildings and roads share the same naming rule, so look it up once
+        name = tags.get("name:en") or tags.get("name") or ""
+
+        # --- Buildings ---
+        if is_building:
+            osm_building_count += 1
+
+            # Unnamed OSM buildings are only counted when PLATEAU replaces them
+            if name or not have_plateau:
+                # Extract building properties
+                levels = int(tags.get("building:levels", 2))
+                building_type = tags.get("building", "yes")
+
+                # Calculate center point of the building
+                # (summed straight from the node arrays — no per-vertex generator)
+                center_lat = sum(map(node_lat.__getitem__, idxs)) / len(idxs)
+                center_lon = sum(map(node_lon.__getitem__, idxs)) / len(idxs)
+
+                building = {
+                    "name": name,
+                    "levels": levels,
+                    "type": building_type,
+                    "center_lat": center_lat,
+                    "center_lon": center_lon,
+                }
+                if not have_plateau:
+                    building["coords"] = coords
+                buildings.append(building)
+
+        # --- Roads, paths, crossings ---
+        if is_road:
+            lanes = int(tags.get("lanes", 2))
+
+            # Determine road width based on type
+            if highway_type in ("primary", "trunk"):
+                width = 12
+            elif highway_type in ("secondary", "tertiary"):
+                width = 8
+            elif highway_type == "pedestrian":
+                width = 6
+            elif highway_type == "footway":
+                width = 3
+            elif highway_type == "service":
+                width = 4
+            else:
+                width = 5
+
+            roads.append({
+                "name": name,
+                "type": highway_type,
+                "width": width,
+                "coords": coords,
+            })
 
-    # Skip if not a building
-    if "building" not in tags:
-        continue
+        # --- Scramble crossing ---
+        if is_scramble_area:
+            scramble_area = coords
+        if is_crossing:
+            scramble_crossings.append(coords)
 
-    # Get the node references (the building's outline)
-    node_refs = [nd.get("ref") for nd in way.findall("nd")]
-
-    # Convert node refs to actual coordinates
-    coords = []
-    for ref in node_refs:
-        if ref in nodes:
-            coords.append(nodes[ref])
-
-    if len(coords) < 3:
-        continue  # Need at least 3 points for a polygon
-
-    # Extract building properties
-    name = tags.get("name:en") or tags.get("name") or ""
-    levels = int(tags.get("building:levels", 2))
-    building_type = tags.get("building", "yes")
-
-    # Calculate center point of the building
-    center_lat = sum(c["lat"] for c in coords) / len(coords)
-    center_lon = sum(c["lon"] for c in coords) / len(coords)
-
-    buildings.append({
-        "name": name,
-        "levels": levels,
-        "type": building_type,
-        "center_lat": center_lat,
-        "center_lon": center_lon,
-        "coords": coords,
-    })
+print(f"  Found {len(node_idx)} nodes (map points)")
 
-print(f"  Found {len(buildings)} buildings (OSM)")
+# === STEP 2: EXTRACT BUILDINGS ===
+print("Step 2: Extracting buildings...")
+print(f"  Found {osm_building_count} buildings (OSM)")
 
 # Show some named buildings
 named = [b for b in buildings if b["name"]]
@@ -88,11 +227,7 @@ for b in named:
 # PLATEAU has real surveyed heights and footprints — much more accurate than OSM!
 print("Step 2a: Loading PLATEAU building data...")
 
-import os
-plateau_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                            "plateau_data", "shibuya_crossing_buildings.json")
-
-if os.path.exists(plateau_path):
+if have_plateau:
     with open(plateau_path) as f:
         plateau_buildings = json.load(f)
 
@@ -113,48 +248,95 @@ if os.path.exists(plateau_path):
 
     buildings = []  # Replace OSM buildings with PLATEAU data!
 
+    # Thousands of PLATEAU records go through this loop, so read each field
+    # out of the record exactly once and keep the lookup method in a local
+    usage_lookup = USAGE_MAP.get
     for pb in plateau_buildings:
-        if "footprint" not in pb or "height" not in pb:
+        footprint = pb.get("footprint")
+        height = pb.get("height")
+        if footprint is None or height is None:
             continue
-        if pb["height"] <= 0 or pb["height"] > 500:
+        if height <= 0 or height > 500:
             continue
-
-        # Convert footprint [(lat,lon), ...] to coord dicts
-        coords = [{"lat": pt[0], "lon": pt[1]} for pt in pb["footprint"]]
-        if len(coords) < 3:
+        if len(footprint) < 3:
             continue
 
-        center_lat = pb.get("center_lat", sum(c["lat"] for c in coords) / len(coords))
-        center_lon = pb.get("center_lon", sum(c["lon"] for c in coords) / len(coords))
-
-        usage_code = pb.get("usage_code", "461")
-        usage = USAGE_MAP.get(usage_code, "unknown")
-        floors = pb.get("floors", max(1, int(pb["height"] / 3.5)))
+        # Convert footprint [(lat,lon), ...] to coord tuples
+        coords = [(pt[0], pt[1]) for pt in footprint]
+
+        # Use PLATEAU's own center when it has one; only average the
+        # footprint when it's missing
+        center_lat = pb.get("center_lat")
+        center_lon = pb.get("center_lon")
+        if center_lat is None:
+            center_lat = sum(pt[0] for pt in coords) / len(coords)
+        if center_lon is None:
+            center_lon = sum(pt[1] for pt in coords) / len(coords)
+
+        usage = usage_lookup(pb.get("usage_code", "461"), "unknown")
+        estimated_floors = max(1, int(height / 3.5))
+        floors = pb.get("floors", estimated_floors)
         if floors >= 9999:
-            floors = max(1, int(pb["height"] / 3.5))
+            floors = estimated_floors
 
         buildings.append({
             "name": "",  # PLATEAU doesn't include names
             "levels": floors,
             "type": usage,
-            "height_m": pb["height"],  # Real surveyed height!
+            "height_m": height,  # Real surveyed height!
             "center_lat": center_lat,
             "center_lon": center_lon,
             "coords": coords,
         })
 
     # Try to match OSM names to nearest PLATEAU building
+    # Distances are great-circle (haversine) meters, so the 30 m threshold
+    # means the same thing anywhere on the map, not just near Tokyo's latitude.
+    MATCH_RADIUS_M = 30
+    EARTH_RADIUS_M = 6371000
+
+    # Precompute each building's center in radians (+ its cosine) once,
+    # instead of redoing the trig for every OSM name it gets compared against
+    match_pts = []
+    for pb in buildings:
+        phi = math.radians(pb["center_lat"])
+        match_pts.append((phi, math.radians(pb["center_lon"]), math.cos(phi)))
+
+    # Bucket centers into a grid of 30 m cells so each name only checks the
+    # 3×3 block of cells around it instead of every building in the area.
+    # East-west meters use the cosine of the most poleward latitude involved,
+    # which never overstates a real distance — so no match within 30 m can
+    # land outside that block.
+    all_match_lats = [pb["center_lat"] for pb in buildings] + [b["center_lat"] for b in named]
+    cell_lat = MATCH_RADIUS_M / EARTH_RADIUS_M  # cell height in radians
+    cell_lon = cell_lat / math.cos(math.radians(max(map(abs, all_match_lats), default=0)))
+
+    match_grid = {}
+    for i, (phi, lam, _) in enumerate(match_pts):
+        cell = (math.floor(phi / cell_lat), math.floor(lam / cell_lon))
+        match_grid.setdefault(cell, []).append(i)
+
     for osm_b in named:
+        phi_q = math.radians(osm_b["center_lat"])
+        lam_q = math.radians(osm_b["center_lon"])
+        cos_q = math.cos(phi_q)
+        row = math.floor(phi_q / cell_lat)
+        col = math.floor(lam_q / cell_lon)
+        # Visit candidates in list order so ties resolve like a full scan
+        candidates = sorted(i for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                            for i in match_grid.get((row + dr, col + dc), ()))
         best_dist = 999999
         best_match = None
-        for pb in buildings:
-            dlat = (osm_b["center_lat"] - pb["center_lat"]) * 111000
-            dlon = (osm_b["center_lon"] - pb["center_lon"]) * 91000
-            dist = math.sqrt(dlat**2 + dlon**2)
+        for i in candidates:
+            phi, lam, cos_phi = match_pts[i]
+            # Haversine formula
+            h = (math.sin((phi - phi_q) / 2) ** 2
+                 + cos_q * cos_phi * math.sin((lam - lam_q) / 2) ** 2)
+            dist = 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
             if dist < best_dist:
                 best_dist = dist
-                best_match = pb
-        if best_match and best_dist < 30:  # Within 30 meters
+                best_match = buildings[i]
+        if best_match and best_dist < MATCH_RADIUS_M:  # Within 30 meters
             best_match["name"] = osm_b["name"]
 
     # === HERO BUILDINGS: Shibuya's iconic landmarks ===
@@ -221,56 +403,6 @@ else:
 
 # === STEP 2B: EXTRACT ROADS ===
 print("Step 2b: Extracting roads and paths...")
-
-roads = []
-
-for way in root.findall("way"):
-    tags = {}
-    for tag in way.findall("tag"):
-        tags[tag.get("k")] = tag.get("v")
-
-    # Look for highway tags (roads, paths, crossings)
-    highway_type = tags.get("highway")
-    if not highway_type:
-        continue
-
-    # Skip non-road types
-    if highway_type in ("bus_stop", "traffic_signals", "crossing"):
-        continue
-
-    node_refs = [nd.get("ref") for nd in way.findall("nd")]
-    coords = []
-    for ref in node_refs:
-        if ref in nodes:
-            coords.append(nodes[ref])
-
-    if len(coords) < 2:
-        continue
-
-    name = tags.get("name:en") or tags.get("name") or ""
-    lanes = int(tags.get("lanes", 2))
-
-    # Determine road width based on type
-    if highway_type in ("primary", "trunk"):
-        width = 12
-    elif highway_type in ("secondary", "tertiary"):
-        width = 8
-    elif highway_type == "pedestrian":
-        width = 6
-    elif highway_type == "footway":
-        width = 3
-    elif highway_type == "service":
-        width = 4
-    else:
-        width = 5
-
-    roads.append({
-        "name": name,
-        "type": highway_type,
-        "width": width,
-        "coords": coords,
-    })
-
 print(f"  Found {len(roads)} roads/paths")
 for r in roads:
     if r["name"]:
@@ -278,34 +410,8 @@ for r in roads:
 
 # === STEP 2C: EXTRACT SCRAMBLE CROSSING ===
 print("Step 2c: Extracting scramble crossing...")
-
-scramble_area = None
-scramble_crossings = []
-
-for way in root.findall("way"):
-    tags = {}
-    for tag in way.findall("tag"):
-        tags[tag.get("k")] = tag.get("v")
-
-    is_scramble = tags.get("crossing:scramble") == "yes"
-    is_area = tags.get("area") == "yes"
-    alt_name = tags.get("alt_name:en", "")
-
-    # The scramble crossing area polygon
-    if "Scramble Crossing" in alt_name or (is_area and "junction" in tags):
-        node_refs = [nd.get("ref") for nd in way.findall("nd")]
-        coords = [nodes[ref] for ref in node_refs if ref in nodes]
-        if len(coords) >= 3:
-            scramble_area = coords
-            print(f"  Found scramble crossing area with {len(coords)} points")
-
-    # Individual crossing lines (the zebra paths)
-    if is_scramble and tags.get("highway") == "footway":
-        node_refs = [nd.get("ref") for nd in way.findall("nd")]
-        coords = [nodes[ref] for ref in node_refs if ref in nodes]
-        if len(coords) >= 2:
-            scramble_crossings.append(coords)
-
+if scramble_area:
+    print(f"  Found scramble crossing area with {len(scramble_area)} points")
 print(f"  Found {len(scramble_crossings)} crossing paths")
 
 # === STEP 2D: LOAD RAILWAY & STATION DATA ===
@@ -351,7 +457,7 @@ if os.path.exists(railway_path):
 
         # MultiLineString = array of line arrays
         for line_coords in feature["geometry"]["coordinates"]:
-            coords = [{"lat": pt[1], "lon": pt[0]} for pt in line_coords]
+            coords = [(pt[1], pt[0]) for pt in line_coords]  # GeoJSON is (lon, lat)
             if len(coords) >= 2:
                 railways.append({
                     "name": line_name,
@@ -382,7 +488,7 @@ if os.path.exists(station_path):
         lon, lat = feature["geometry"]["coordinates"]
 
         # Only keep unique station positions (skip duplicates at same location)
-        station_key = f"{name}_{round(lat, 4)}_{round(lon, 4)}"
+        station_key = (name, round(lat, 4), round(lon, 4))
         if station_key in seen_stations:
             continue
         seen_stations.add(station_key)
@@ -425,23 +531,42 @@ else:
 print("Step 3: Converting coordinates...")
 
 # Find the bounding box of all buildings
-all_lats = [c["lat"] for b in buildings for c in b["coords"]]
-all_lons = [c["lon"] for b in buildings for c in b["coords"]]
-
-min_lat, max_lat = min(all_lats), max(all_lats)
-min_lon, max_lon = min(all_lons), max(all_lons)
+# Keep running min/max per outline instead of flattening every vertex of
+# every building into two giant lists first
+min_lat = min_lon = math.inf
+max_lat = max_lon = -math.inf
+for b in buildings:
+    lats, lons = zip(*b["coords"])
+    min_lat, max_lat = min(min_lat, min(lats)), max(max_lat, max(lats))
+    min_lon, max_lon = min(min_lon, min(lons)), max(max_lon, max(lons))
 
 # Scale factor: convert tiny lat/lon differences to pixel coordinates
 # At Tokyo's latitude, 1 degree ≈ 111,000 meters (lat) and ≈ 91,000 meters (lon)
 METERS_PER_LEVEL = 3.5  # Average floor height in meters
 SCALE = 350000  # Pixels per degree (adjust to change map size)
 
+# Longitude shrinks by cos(latitude). Our whole map spans well under 0.1° of
+# latitude, so one cosine taken at the middle of the bounding box is good to
+# ~5 decimal places for every point — no need to redo the trig per vertex.
+COS_REF_LAT = math.cos(math.radians((min_lat + max_lat) * 0.5))
+
 def latlon_to_xy(lat, lon):
     """Convert geographic coordinates to local pixel coordinates"""
-    x = (lon - min_lon) * SCALE * math.cos(math.radians(lat))
+    x = (lon - min_lon) * SCALE * COS_REF_LAT
     y = (max_lat - lat) * SCALE  # Flip Y (screen Y goes down)
     return x, y
 
+def coords_to_xy(coords):
+    """Convert a whole outline of (lat, lon) points to (x, y) tuples in one call.
+
+    Same math as latlon_to_xy, but the constants are bound once per outline
+    instead of paying a function call per vertex. latlon_to_xy stays for
+    one-off points (centers, stations, tile corners).
+    """
+    lon0, lat0, scale = min_lon, max_lat, SCALE
+    x_scale = SCALE * COS_REF_LAT
+    return [((lon - lon0) * x_scale, (lat0 - lat) * scale) for lat, lon in coords]
+
 # Convert all buildings to screen coordinates
 for b in buildings:
     cx, cy = latlon_to_xy(b["center_lat"], b["center_lon"])
@@ -449,10 +574,7 @@ for b in buildings:
     b["screen_y"] = cy
 
     # Convert polygon outline too
-    b["screen_coords"] = []
-    for c in b["coords"]:
-        sx, sy = latlon_to_xy(c["lat"], c["lon"])
-        b["screen_coords"].append({"x": sx, "y": sy})
+    b["screen_coords"] = coords_to_xy(b["coords"])
 
     # Building height: use real PLATEAU height or estimate from levels
     real_height = b.get("height_m", b["levels"] * METERS_PER_LEVEL)
@@ -460,32 +582,22 @@ for b in buildings:
 
 # Convert road coordinates
 for r in roads:
-    r["screen_coords"] = []
-    for c in r["coords"]:
-        sx, sy = latlon_to_xy(c["lat"], c["lon"])
-        r["screen_coords"].append({"x": sx, "y": sy})
+    r["screen_coords"] = coords_to_xy(r["coords"])
 
 # Convert scramble crossing coordinates
 scramble_area_screen = []
 if scramble_area:
-    for c in scramble_area:
-        sx, sy = latlon_to_xy(c["lat"], c["lon"])
-        scramble_area_screen.append({"x": round(sx, 1), "y": round(sy, 1)})
+    scramble_area_screen = [{"x": round(x, 1), "y": round(y, 1)}
+                            for x, y in coords_to_xy(scramble_area)]
 
 scramble_crossings_screen = []
 for crossing in scramble_crossings:
-    line = []
-    for c in crossing:
-        sx, sy = latlon_to_xy(c["lat"], c["lon"])
-        line.append({"x": round(sx, 1), "y": round(sy, 1)})
-    scramble_crossings_screen.append(line)
+    scramble_crossings_screen.append([{"x": round(x, 1), "y": round(y, 1)}
+                                      for x, y in coords_to_xy(crossing)])
 
 # Convert railway coordinates
 for r in railways:
-    r["screen_coords"] = []
-    for c in r["coords"]:
-        sx, sy = latlon_to_xy(c["lat"], c["lon"])
-        r["screen_coords"].append({"x": sx, "y": sy})
+    r["screen_coords"] = coords_to_xy(r["coords"])
 
 # Convert station coordinates
 for s in stations:
@@ -506,10 +618,19 @@ print("Step 3b: Downloading GSI satellite tiles...")
 
 import urllib.request
 import base64
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 GSI_ZOOM = 17  # Each tile ≈ 305m × 305m at Tokyo's latitude
 GSI_TILE_SIZE = 256  # Standard web map tile size
 
+# True = embed tiles as base64 so the HTML is one self-contained file.
+# False = copy the JPEGs into a folder next to the HTML and load them by
+# URL instead: a much smaller page (base64 adds 33%) and no base64 decode
+# step in the browser, but you have to keep the folder with the HTML.
+EMBED_GSI_TILES = True
+GSI_TILE_DIR_NAME = "shibuya_gsi_tiles"  # Folder used when not embedding
+
 def latlon_to_tile(lat, lon, zoom):
     """Convert lat/lon to web map tile coordinates (Mercator projection)."""
     n = 2 ** zoom
@@ -543,76 +664,132 @@ tile_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                               "plateau_data", "gsi_tiles")
 os.makedirs(tile_cache_dir, exist_ok=True)
 
+def tile_cache_path(tx, ty):
+    return os.path.join(tile_cache_dir, f"{GSI_ZOOM}_{tx}_{ty}.jpg")
+
+def download_tile(job):
+    """Fetch one tile into the cache. Returns the error, or None on success."""
+    tx, ty, url, cache_path = job
+    try:
+        urllib.request.urlretrieve(url, cache_path)
+    except Exception as e:
+        return e
+    return None
+
+tile_grid = [(tx, ty) for tx in range(tile_min_x, tile_max_x + 1)
+                      for ty in range(tile_min_y, tile_max_y + 1)]
+
+# Download every uncached tile at once — each request spends nearly all its
+# time waiting on the network, so a pool of threads finishes in roughly one
+# round-trip instead of one round-trip per tile
+missing = [(tx, ty,
+            f"https://cyberjapandata.gsi.go.jp/xyz/seamlessphoto/{GSI_ZOOM}/{tx}/{ty}.jpg",
+            tile_cache_path(tx, ty))
+           for tx, ty in tile_grid if not os.path.exists(tile_cache_path(tx, ty))]
+failed_tiles = set()
+if missing:
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        for (tx, ty, _, _), error in zip(missing, pool.map(download_tile, missing)):
+            if error is not None:
+                print(f"  Warning: Could not download tile {tx},{ty}: {error}")
+                failed_tiles.add((tx, ty))
+
+if not EMBED_GSI_TILES:
+    tile_output_dir = os.path.join(os.path.dirname(output_file), GSI_TILE_DIR_NAME)
+    os.makedirs(tile_output_dir, exist_ok=True)
+
+# Neighbouring tiles share their edges, and in our flat projection x only
+# depends on longitude and y only on latitude. So convert each grid line of
+# the tile grid once, instead of converting 4 corners for every tile.
+tile_col_x = {}
+for tx in range(tile_min_x, tile_max_x + 2):
+    _, edge_lon = tile_to_latlon(tx, 0, GSI_ZOOM)
+    tile_col_x[tx] = round(latlon_to_xy(max_lat, edge_lon)[0], 1)
+tile_row_y = {}
+for ty in range(tile_min_y, tile_max_y + 2):
+    edge_lat, _ = tile_to_latlon(0, ty, GSI_ZOOM)
+    tile_row_y[ty] = round(latlon_to_xy(edge_lat, min_lon)[1], 1)
+
 gsi_tiles = []
-for tx in range(tile_min_x, tile_max_x + 1):
-    for ty in range(tile_min_y, tile_max_y + 1):
-        cache_path = os.path.join(tile_cache_dir, f"{GSI_ZOOM}_{tx}_{ty}.jpg")
-
-        # Download if not cached
-        if not os.path.exists(cache_path):
-            url = f"https://cyberjapandata.gsi.go.jp/xyz/seamlessphoto/{GSI_ZOOM}/{tx}/{ty}.jpg"
-            try:
-                urllib.request.urlretrieve(url, cache_path)
-            except Exception as e:
-                print(f"  Warning: Could not download tile {tx},{ty}: {e}")
-                continue
+tile_bytes = 0
+for tx, ty in tile_grid:
+    cache_path = tile_cache_path(tx, ty)
+    if (tx, ty) in failed_tiles or not os.path.exists(cache_path):
+        continue
 
-        if os.path.exists(cache_path):
-            with open(cache_path, "rb") as f:
-                b64 = base64.b64encode(f.read()).decode("ascii")
-
-            # Calculate tile's geographic bounds
-            top_lat, left_lon = tile_to_latlon(tx, ty, GSI_ZOOM)
-            bottom_lat, right_lon = tile_to_latlon(tx + 1, ty + 1, GSI_ZOOM)
-
-            # Convert all 4 corners to our local screen coordinates
-            x0, y0 = latlon_to_xy(top_lat, left_lon)     # top-left
-            x1, y1 = latlon_to_xy(top_lat, right_lon)     # top-right
-            x2, y2 = latlon_to_xy(bottom_lat, left_lon)   # bottom-left
-            x3, y3 = latlon_to_xy(bottom_lat, right_lon)  # bottom-right
-
-            gsi_tiles.append({
-                "x0": round(x0, 1), "y0": round(y0, 1),
-                "x1": round(x1, 1), "y1": round(y1, 1),
-                "x2": round(x2, 1), "y2": round(y2, 1),
-                "x3": round(x3, 1), "y3": round(y3, 1),
-                "data": b64,
-            })
+    if EMBED_GSI_TILES:
+        with open(cache_path, "rb") as f:
+            image = {"data": base64.b64encode(f.read()).decode("ascii")}
+        tile_bytes += len(image["data"])
+    else:
+        tile_name = os.path.basename(cache_path)
+        shutil.copyfile(cache_path, os.path.join(tile_output_dir, tile_name))
+        image = {"src": f"{GSI_TILE_DIR_NAME}/{tile_name}"}
+        tile_bytes += os.path.getsize(cache_path)
+
+    # The tile's 4 corners in our local screen coordinates
+    left, right = tile_col_x[tx], tile_col_x[tx + 1]
+    top, bottom = tile_row_y[ty], tile_row_y[ty + 1]
+
+    gsi_tiles.append({
+        "x0": left, "y0": top,       # top-left
+        "x1": right, "y1": top,      # top-right
+        "x2": left, "y2": bottom,    # bottom-left
+        "x3": right, "y3": bottom,   # bottom-right
+        **image,
+    })
 
-print(f"  Loaded {len(gsi_tiles)} satellite tiles ({sum(len(t['data']) for t in gsi_tiles) // 1024}KB base64)")
+if EMBED_GSI_TILES:
+    print(f"  Loaded {len(gsi_tiles)} satellite tiles ({tile_bytes // 1024}KB base64)")
+else:
+    print(f"  Loaded {len(gsi_tiles)} satellite tiles ({tile_bytes // 1024}KB, copied to {tile_output_dir})")
+
+def to_json(obj):
+    """Compact JSON for embedding in the page (no indentation or spaces)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"))
 
-gsi_tiles_json = json.dumps([{
-    "x0": t["x0"], "y0": t["y0"],
-    "x1": t["x1"], "y1": t["y1"],
-    "x2": t["x2"], "y2": t["y2"],
-    "x3": t["x3"], "y3": t["y3"],
-    "data": t["data"],
-} for t in gsi_tiles])
+# gsi_tiles already holds exactly the fields the page needs, so serialize it
+# as-is rather than copying every base64 string into a second list first
+gsi_tiles_json = to_json(gsi_tiles)
 
 # === STEP 4: GENERATE THE HTML MAP ===
 print("Step 4: Generating isometric HTML map...")
 
 # Convert scramble to JSON
-scramble_area_json = json.dumps(scramble_area_screen)
-scramble_crossings_json = json.dumps(scramble_crossings_screen)
+scramble_area_json = to_json(scramble_area_screen)
+scramble_crossings_json = to_json(scramble_crossings_screen)
+
+# Every outline vertex goes into ONE flat Float32 buffer (x0, y0, x1, y1, ...)
+# that the page decodes once — each feature only carries its [start, end) slice.
+# Roads and railways are packed first so the page can re-project all the line
+# vertices as one contiguous run whenever the camera moves
+coord_buffer = array("f")
+
+def pack_coords(screen_coords):
+    """Append an outline to coord_buffer and return its [start, end) range."""
+    start = len(coord_buffer)
+    coord_buffer.extend(round(v, 1) for pt in screen_coords for v in pt)
+    return [start, len(coord_buffer)]
 
 # Convert roads to JSON
-roads_json = json.dumps([{
+roads_json = to_json([{
     "name": r["name"],
     "type": r["type"],
     "width": r["width"],
-    "coords": [{"x": round(c["x"], 1), "y": round(c["y"], 1)} for c in r["screen_coords"]],
-} for r in roads], indent=2)
+    "coordRange": pack_coords(r["screen_coords"]),
+} for r in roads])
 
 # Convert railways to JSON
-railways_json = json.dumps([{
+railways_json = to_json([{
     "name": r["name"],
     "color": r["color"],
-    "coords": [{"x": round(c["x"], 1), "y": round(c["y"], 1)} for c in r["screen_coords"]],
+    "coordRange": pack_coords(r["screen_coords"]),
 } for r in railways])
 
 # Convert stations to JSON
-stations_json = json.dumps([{
+stations_json = to_json([{
     "name": s["name"],
     "line": s["line"],
     "color": s["color"],
@@ -621,7 +798,7 @@ stations_json = json.dumps([{
 } for s in stations])
 
 # Convert parks to JSON
-parks_json = json.dumps([{
+parks_json = to_json([{
     "name": p["name"],
     "area": p["area"],
     "x": round(p["screen_x"], 1),
@@ -629,18 +806,30 @@ parks_json = json.dumps([{
 } for p in parks])
 
 # Convert buildings to JSON for embedding in HTML
-buildings_json = json.dumps([{
-    "name": b["name"],
-    "levels": b["levels"],
-    "type": b["type"],
-    "usage": b.get("type", "unknown"),
-    "height_m": round(b.get("height_m", 0), 1),
-    "x": round(b["screen_x"], 1),
-    "y": round(b["screen_y"], 1),
-    "height": round(b["height"], 1),
-    "coords": [{"x": round(c["x"], 1), "y": round(c["y"], 1)} for c in b["screen_coords"]],
-    "hero": b.get("hero", None),
-} for b in buildings], indent=2)
+# Emitted far-to-near (painter's algorithm: sorted by x + y of the rounded
+# positions the page sees), so the page draws them in array order and never
+# sorts. Written column by column ({"x": [...], "y": [...], ...}) so each field
+# name appears once instead of once per building; the page rebuilds the records
+buildings_by_depth = sorted(
+    buildings, key=lambda b: round(b["screen_x"], 1) + round(b["screen_y"], 1))
+buildings_json = to_json({
+    "name": [b["name"] for b in buildings_by_depth],
+    "levels": [b["levels"] for b in buildings_by_depth],
+    "type": [b["type"] for b in buildings_by_depth],
+    "usage": [b.get("type", "unknown") for b in buildings_by_depth],
+    "height_m": [round(b.get("height_m", 0), 1) for b in buildings_by_depth],
+    "x": [round(b["screen_x"], 1) for b in buildings_by_depth],
+    "y": [round(b["screen_y"], 1) for b in buildings_by_depth],
+    "height": [round(b["height"], 1) for b in buildings_by_depth],
+    "coordRange": [pack_coords(b["screen_coords"]) for b in buildings_by_depth],
+    "hero": [b.get("hero", None) for b in buildings_by_depth],
+})
+
+# Float32Array reads the platform's byte order, which is little-endian in
+# every browser that matters
+if sys.byteorder == "big":
+    coord_buffer.byteswap()
+coords_b64 = base64.b64encode(coord_buffer.tobytes()).decode("ascii")
 
 html = f"""<!DOCTYPE html>
 <html>
@@ -723,15 +912,25 @@ html = f"""<!DOCTYPE html>
         const canvas = document.getElementById("city");
         const displayCtx = canvas.getContext("2d");
 
-        // The tiny offscreen canvas where we actually draw
+        // The tiny offscreen canvas where we actually draw. It holds the whole
+        // world around the view: one view-sized screen (viewW x viewH tiny
+        // pixels) in the middle plus half a screen of margin on every side,
+        // so panning can just slide it (see render). The margin stays small
+        // because every zoom step has to repaint the whole layer
         const offscreen = document.createElement("canvas");
         const ctx = offscreen.getContext("2d");
+        let viewW = 0, viewH = 0;
+        let marginX = 0, marginY = 0;
 
         function resizeCanvases() {{
             canvas.width = window.innerWidth;
             canvas.height = window.innerHeight - 50;
-            offscreen.width = Math.floor(canvas.width / PIXEL_SCALE);
-            offscreen.height = Math.floor(canvas.height / PIXEL_SCALE);
+            viewW = Math.floor(canvas.width / PIXEL_SCALE);
+            viewH = Math.floor(canvas.height / PIXEL_SCALE);
+            marginX = Math.ceil(viewW / 2);
+            marginY = Math.ceil(viewH / 2);
+            offscreen.width = viewW + 2 * marginX;
+            offscreen.height = viewH + 2 * marginY;
             // Disable anti-aliasing on both canvases
             displayCtx.imageSmoothingEnabled = false;
             ctx.imageSmoothingEnabled = false;
@@ -739,11 +938,32 @@ html = f"""<!DOCTYPE html>
         resizeCanvases();
         window.addEventListener("resize", () => {{
             resizeCanvases();
+            cameraVersion++;  // The view size moves the world layer's origin
             render();
         }});
 
         // === DATA FROM OSM + PLATEAU ===
-        const buildings = {buildings_json};
+        // Buildings arrive as columns of fields. The numbers the draw passes
+        // read for every building on every render stay columns, in typed
+        // arrays indexed by building number (in painter's order). A record
+        // per building is still rebuilt for everything else: names, usage,
+        // hero details, the popup and hit testing
+        const buildingColumns = {buildings_json};
+        const buildingCount = buildingColumns.x.length;
+        const buildingX = Float64Array.from(buildingColumns.x);
+        const buildingY = Float64Array.from(buildingColumns.y);
+        const buildingHeight = Float64Array.from(buildingColumns.height);
+        const buildingLevels = Float64Array.from(buildingColumns.levels);
+        // Each footprint's [start, end) slice of coordBuffer
+        const buildingCoordStart = Int32Array.from(buildingColumns.coordRange, r => r[0]);
+        const buildingCoordEnd = Int32Array.from(buildingColumns.coordRange, r => r[1]);
+        const buildings = buildingColumns.x.map((_, i) => {{
+            const building = {{}};
+            for (const field in buildingColumns) {{
+                building[field] = buildingColumns[field][i];
+            }}
+            return building;
+        }});
         const roads = {roads_json};
         const scrambleArea = {scramble_area_json};
         const scrambleCrossings = {scramble_crossings_json};
@@ -751,22 +971,65 @@ html = f"""<!DOCTYPE html>
         const stations = {stations_json};
         const parks = {parks_json};
 
+        // All outlines share one Float32Array; each feature's coords is a
+        // subarray view of flat [x0, y0, x1, y1, ...] pairs
+        const coordBuffer = new Float32Array(
+            Uint8Array.from(atob("{coords_b64}"), c => c.charCodeAt(0)).buffer);
+        for (const feature of [...buildings, ...roads, ...railways]) {{
+            feature.coords = coordBuffer.subarray(feature.coordRange[0], feature.coordRange[1]);
+        }}
+        // Building colors only depend on the building itself, so work them
+        // (and their darker outline shades) out once instead of every frame
+        for (const building of buildings) {{
+            const colors = getBuildingColors(building);
+            building._colors = colors;
+            building._colorsDark = {{
+                left: adjustHSL(colors.left, -20),
+                right: adjustHSL(colors.right, -20),
+                top: adjustHSL(colors.top, -20)
+            }};
+            // Sign of the footprint's area (its winding), for back-face
+            // culling. The iso projection never mirrors, so this is also the
+            // winding on screen, at every zoom. 0 = degenerate, cull nothing
+            const coords = building.coords;
+            const n = coords.length / 2;
+            let area = 0;
+            for (let i = 0; i < n; i++) {{
+                const j = (i + 1) % n;
+                area += coords[2 * i] * coords[2 * j + 1] - coords[2 * j] * coords[2 * i + 1];
+            }}
+            building._winding = Math.sign(area);
+        }}
+
         // === GSI SATELLITE TILES (国土地理院) ===
-        // Real aerial photos from Japan's government — embedded as base64!
+        // Real aerial photos from Japan's government — embedded as base64,
+        // or as relative URLs when the build copies the JPEGs beside the page
         const gsiTileData = {gsi_tiles_json};
 
-        // Load tile images from base64 data
+        // Load tile images from base64 data (or their files)
         const gsiTiles = [];
         let gsiTilesLoaded = 0;
         for (const td of gsiTileData) {{
             const img = new Image();
             const tile = {{ img, x0: td.x0, y0: td.y0, x1: td.x1, y1: td.y1,
                            x2: td.x2, y2: td.y2, x3: td.x3, y3: td.y3 }};
-            img.onload = () => {{
+            const finish = () => {{
+                tile.loaded = true;
                 gsiTilesLoaded++;
                 if (gsiTilesLoaded === gsiTileData.length) render();
             }};
-            img.src = "data:image/jpeg;base64," + td.data;
+            img.onload = () => {{
+                // Decode the JPEG into a bitmap off the main thread, so the
+                // first ground composite doesn't stall on decoding every tile
+                // (if that isn't available or fails, the <img> is drawn as before)
+                if (!window.createImageBitmap) {{
+                    finish();
+                    return;
+                }}
+                createImageBitmap(img).then(bitmap => {{ tile.img = bitmap; }}, () => {{}})
+                                      .then(finish);
+            }};
+            img.src = td.src || "data:image/jpeg;base64," + td.data;
             gsiTiles.push(tile);
         }}
 
@@ -776,20 +1039,180 @@ html = f"""<!DOCTYPE html>
             y: -200,
             zoom: 1.3
         }};
+        let cameraVersion = 0;  // Bumped on every pan/zoom so caches know to refresh
 
         // === ISOMETRIC TRANSFORM ===
+        // screen x = (x - y) * ax + ox,  screen y = (x + y) * ay + oy
+        // Note: the coefficients already divide by PIXEL_SCALE because we draw
+        // on the tiny canvas. The offsets put the camera the world layer was
+        // last drawn for one view down and right, so the view lands in the
+        // middle of the layer. Set by setIsoProjection() in renderWorld().
+        const isoProj = {{ ax: 0, ay: 0, ox: 0, oy: 0 }};
+
+        // Zoom as seen on the tiny canvas, and whether it is close enough
+        // for the urban noise (vending machines, trees, pedestrians) to show.
+        // Also set by setIsoProjection().
+        let zoomScale = 0;
+        let showNoise = false;
+
+        function setIsoProjection() {{
+            zoomScale = camera.zoom / PIXEL_SCALE;
+            showNoise = zoomScale >= 0.35;
+            isoProj.ax = 0.7071 * camera.zoom / PIXEL_SCALE;
+            isoProj.ay = 0.3536 * camera.zoom / PIXEL_SCALE;
+            // The origin sits on a whole tiny pixel. Then every corner rounds
+            // to the same spot relative to the others however far the camera
+            // has panned, so a cached building sprite pinned to its first
+            // corner lines up exactly with freshly projected roads and hit boxes
+            isoProj.ox = Math.round(camera.x / PIXEL_SCALE) + marginX;
+            isoProj.oy = Math.round(camera.y / PIXEL_SCALE) + marginY;
+        }}
+
+        // Results snap to whole pixels right here — this is pixel art, so every
+        // shape starts on the pixel grid and nothing downstream re-rounds
         function toIso(x, y) {{
-            // Note: we divide by PIXEL_SCALE because we draw on the tiny canvas
             return {{
-                x: ((x - y) * 0.7071 * camera.zoom + camera.x) / PIXEL_SCALE,
-                y: ((x + y) * 0.3536 * camera.zoom + camera.y) / PIXEL_SCALE
+                x: Math.round((x - y) * isoProj.ax + isoProj.ox),
+                y: Math.round((x + y) * isoProj.ay + isoProj.oy)
             }};
         }}
 
+        // Same as toIso, but writes [x, y] into out instead of allocating,
+        // for code that projects many single points per frame
+        const ISO_TMP = new Float64Array(2);
+        function toIsoInto(x, y, out) {{
+            out[0] = Math.round((x - y) * isoProj.ax + isoProj.ox);
+            out[1] = Math.round((x + y) * isoProj.ay + isoProj.oy);
+        }}
+
+        // Iso-projected road and railway outlines as flat [x0, y0, x1, y1, ...].
+        // The build packs every road and railway ahead of the buildings in
+        // coordBuffer, so after the camera moves that whole front section is
+        // projected in one tight loop into isoBuffer, and each feature just
+        // keeps a subarray view of its own part. Buildings are never
+        // projected this way, so isoBuffer stops where their coords begin.
+        let lineCoordsEnd = 0;
+        for (const feature of [...roads, ...railways]) {{
+            lineCoordsEnd = Math.max(lineCoordsEnd, feature.coordRange[1]);
+        }}
+        const isoBuffer = new Float32Array(lineCoordsEnd);
+        for (const feature of [...roads, ...railways]) {{
+            feature._isoXY = isoBuffer.subarray(feature.coordRange[0], feature.coordRange[1]);
+        }}
+        let isoBufferVersion = -1;
+
+        function isoCoords(feature) {{
+            if (isoBufferVersion !== cameraVersion) {{
+                const {{ ax, ay, ox, oy }} = isoProj;
+                for (let i = 0; i < lineCoordsEnd; i += 2) {{
+                    const x = coordBuffer[i], y = coordBuffer[i + 1];
+                    // Same (pixel-snapped) math as toIso
+                    isoBuffer[i] = Math.round((x - y) * ax + ox);
+                    isoBuffer[i + 1] = Math.round((x + y) * ay + oy);
+                }}
+                isoBufferVersion = cameraVersion;
+            }}
+            return feature._isoXY;
+        }}
+
+        // Outline extent along the two iso screen axes: screen x follows
+        // (x - y) and screen y follows (x + y), so these four numbers give the
+        // feature's on-screen box for any camera without projecting a vertex
+        // Stored as [minU, maxU, minV, maxV] at offset k of a Float64Array:
+        // one shared column for all buildings (k = 4 * building number), and
+        // a 4-entry array of its own for each road and railway
+        function isoBoundsInto(start, end, out, k) {{
+            let minU = Infinity, maxU = -Infinity, minV = Infinity, maxV = -Infinity;
+            for (let i = start; i < end; i += 2) {{
+                const u = coordBuffer[i] - coordBuffer[i + 1];
+                const v = coordBuffer[i] + coordBuffer[i + 1];
+                if (u < minU) minU = u;
+                if (u > maxU) maxU = u;
+                if (v < minV) minV = v;
+                if (v > maxV) maxV = v;
+            }}
+            out[k] = minU;
+            out[k + 1] = maxU;
+            out[k + 2] = minV;
+            out[k + 3] = maxV;
+        }}
+        const buildingBounds = new Float64Array(4 * buildingCount);
+        for (let i = 0; i < buildingCount; i++) {{
+            isoBoundsInto(buildingCoordStart[i], buildingCoordEnd[i], buildingBounds, 4 * i);
+        }}
+        for (const feature of [...roads, ...railways]) {{
+            feature._isoBounds = new Float64Array(4);
+            isoBoundsInto(feature.coordRange[0], feature.coordRange[1], feature._isoBounds, 0);
+        }}
+
+        // Does a feature land entirely outside the world layer? Its box (at
+        // offset k of bounds) is grown by pad tiny pixels for line widths,
+        // signs and labels, and reaches lift world units higher up for
+        // building walls.
+        function offLayer(bounds, k, pad, lift = 0) {{
+            const {{ ax, ay, ox, oy }} = isoProj;
+            return bounds[k + 1] * ax + ox < -pad
+                || bounds[k] * ax + ox >= offscreen.width + pad
+                || bounds[k + 3] * ay + oy < -pad
+                || bounds[k + 2] * ay + oy - lift * camera.zoom / PIXEL_SCALE >= offscreen.height + pad;
+        }}
+
+        // Start a new path along a flat [x0, y0, x1, y1, ...] polyline
+        function traceIsoLine(pts) {{
+            ctx.beginPath();
+            ctx.moveTo(pts[0], pts[1]);
+            for (let i = 2; i < pts.length; i += 2) {{
+                ctx.lineTo(pts[i], pts[i + 1]);
+            }}
+        }}
+
         // === BUILDING HIT DETECTION ===
         // During each render, we record every building's screen bounding box.
-        // Stored in render order (painter's algorithm), so LAST entry wins on overlap.
-        let buildingHitBoxes = [];  // each entry: building + bounding box
+        // The boxes are bucketed into a grid of HIT_CELL-sized screen cells, so
+        // a click only checks the buildings in its own cell. Each cell keeps
+        // render order (painter's algorithm), so LAST entry wins on overlap.
+        const HIT_CELL = 16;
+        const hitGrid = [];  // cell (row * hitCols + col) → hit boxes touching it
+        let hitCols = 0, hitRows = 0;
+
+        function resetHitGrid() {{
+            hitCols = Math.ceil(offscreen.width / HIT_CELL);
+            hitRows = Math.ceil(offscreen.height / HIT_CELL);
+            for (let c = 0; c < hitCols * hitRows; c++) {{
+                if (hitGrid[c]) hitGrid[c].length = 0;
+                else hitGrid[c] = [];
+            }}
+        }}
+
+        function addHitBox(building, minX, minY, maxX, maxY) {{
+            const hb = {{ building, minX, minY, maxX, maxY }};
+            const col0 = Math.max(0, Math.floor(minX / HIT_CELL));
+            const col1 = Math.min(hitCols - 1, Math.floor(maxX / HIT_CELL));
+            const row0 = Math.max(0, Math.floor(minY / HIT_CELL));
+            const row1 = Math.min(hitRows - 1, Math.floor(maxY / HIT_CELL));
+            for (let row = row0; row <= row1; row++) {{
+                for (let col = col0; col <= col1; col++) {{
+                    hitGrid[row * hitCols + col].push(hb);
+                }}
+            }}
+        }}
+
+        // Topmost building under an offscreen-canvas point, or null
+        function findBuildingAt(offX, offY) {{
+            const col = Math.floor(offX / HIT_CELL);
+            const row = Math.floor(offY / HIT_CELL);
+            if (col < 0 || col >= hitCols || row < 0 || row >= hitRows) return null;
+            // Search the cell in REVERSE order (topmost building drawn last)
+            const cell = hitGrid[row * hitCols + col];
+            for (let i = cell.length - 1; i >= 0; i--) {{
+                const hb = cell[i];
+                if (offX >= hb.minX && offX <= hb.maxX &&
+                    offY >= hb.minY && offY <= hb.maxY) {{
+                    return hb.building;
+                }}
+            }}
+            return null;
+        }}
         let selectedBuilding = null;
 
         // === 16-BIT COLOR PALETTE (Super Mario World style) ===
@@ -829,9 +1252,9 @@ html = f"""<!DOCTYPE html>
             // Taller buildings = slightly darker gray (concrete/steel feel)
             const baseLightness = 58 - heightFactor * 14 + (seed % 8);
 
-            const left  = `hsl(${{hue}}, ${{sat}}%, ${{baseLightness}}%)`;
-            const right = `hsl(${{hue}}, ${{sat + 3}}%, ${{baseLightness - 12}}%)`;
-            const top   = `hsl(${{hue}}, ${{sat - 4}}%, ${{baseLightness + 14}}%)`;
+            const left  = {{ h: hue, s: sat,     l: baseLightness }};
+            const right = {{ h: hue, s: sat + 3, l: baseLightness - 12 }};
+            const top   = {{ h: hue, s: sat - 4, l: baseLightness + 14 }};
 
             return {{ left, right, top }};
         }}
@@ -856,15 +1279,39 @@ html = f"""<!DOCTYPE html>
             return lerpPoint(bottom, top, v);
         }}
 
-        // Adjust lightness of an HSL color string
-        // Positive = lighter, negative = darker
-        function adjustHSL(hslStr, lightnessAdjust) {{
-            const match = hslStr.match(/hsl[(]([^,]+),\\s*([^%]+)%,\\s*([^%]+)%[)]/);
-            if (!match) return hslStr;
-            const h = parseFloat(match[1]);
-            const s = parseFloat(match[2]);
-            const l = Math.min(100, Math.max(0, parseFloat(match[3]) + lightnessAdjust));
-            return `hsl(${{h}}, ${{s}}%, ${{l}}%)`;
+        // bilinearPoint specialized for the wall's left edge (u = 0), right
+        // edge (u = 1) and center line (u = 0.5): no u interpolation per call
+        function bilinearLeftEdge(g1, r1, v) {{
+            return {{ x: g1.x + (r1.x - g1.x) * v, y: g1.y + (r1.y - g1.y) * v }};
+        }}
+        function bilinearRightEdge(g2, r2, v) {{
+            return {{ x: g2.x + (r2.x - g2.x) * v, y: g2.y + (r2.y - g2.y) * v }};
+        }}
+        function bilinearMid(g1, g2, r1, r2, v) {{
+            const bx = (g1.x + g2.x) * 0.5, by = (g1.y + g2.y) * 0.5;
+            const tx = (r1.x + r2.x) * 0.5, ty = (r1.y + r2.y) * 0.5;
+            return {{ x: bx + (tx - bx) * v, y: by + (ty - by) * v }};
+        }}
+
+        // Building colors are {{ h, s, l }} numbers, so shading one is plain
+        // arithmetic. Positive = lighter, negative = darker.
+        // (Palette hex strings have no HSL to adjust and pass through as-is.)
+        function adjustHSL(color, lightnessAdjust) {{
+            if (typeof color === 'string') return color;
+            return {{ h: color.h, s: color.s, l: Math.min(100, Math.max(0, color.l + lightnessAdjust)) }};
+        }}
+
+        // Format an {{ h, s, l }} color for fillStyle/strokeStyle (cached per color)
+        const hslStrings = new Map();
+        function hslString(color) {{
+            if (typeof color === 'string') return color;
+            const key = color.h + '|' + color.s + '|' + color.l;
+            let str = hslStrings.get(key);
+            if (str === undefined) {{
+                str = `hsl(${{color.h}}, ${{color.s}}%, ${{color.l}}%)`;
+                hslStrings.set(key, str);
+            }}
+            return str;
         }}
 
         // === DITHER PATTERN for pixel-art roof textures ===
@@ -891,11 +1338,38 @@ html = f"""<!DOCTYPE html>
             return pattern;
         }}
 
-        // Shibuya neon sign — draws a skewed parallelogram with glow
+        // Neon glow sprite: a soft blob of the sign's color, rendered once per
+        // color and stretched behind each sign. shadowBlur would make the GPU
+        // blur-and-paint every sign a second time on every frame.
+        const GLOW_SIZE = 32;   // Sprite resolution
+        const GLOW_SPILL = 5;   // How far the glow reaches past the sign edges
+        const glowCache = new Map();
+        function getGlowSprite(color) {{
+            if (glowCache.has(color)) return glowCache.get(color);
+            const sprite = document.createElement('canvas');
+            sprite.width = GLOW_SIZE;
+            sprite.height = GLOW_SIZE;
+            const spriteCtx = sprite.getContext('2d');
+            const r = GLOW_SIZE / 2;
+            const gradient = spriteCtx.createRadialGradient(r, r, 0, r, r, r);
+            gradient.addColorStop(0, color + '99');  // Sign colors are #RRGGBB
+            gradient.addColorStop(1, color + '00');
+            spriteCtx.fillStyle = gradient;
+            spriteCtx.fillRect(0, 0, GLOW_SIZE, GLOW_SIZE);
+            glowCache.set(color, sprite);
+            return sprite;
+        }}
+
+        // Draw the cached glow around a sign's bounding box
+        function drawSignGlow(ctx, x, y, width, height, color) {{
+            ctx.drawImage(getGlowSprite(color),
+                x - GLOW_SPILL, y - GLOW_SPILL,
+                width + GLOW_SPILL * 2, width / 2 + height + GLOW_SPILL * 2);
+        }}
+
+        // Shibuya neon sign — draws a skewed parallelogram (glow goes underneath)
         function drawShibuyaSign(ctx, x, y, width, height, color) {{
             ctx.fillStyle = color;
-            ctx.shadowBlur = 5;
-            ctx.shadowColor = color;
 
             // Draw skewed rectangle for the billboard (2:1 isometric slope)
             ctx.beginPath();
@@ -905,8 +1379,6 @@ html = f"""<!DOCTYPE html>
             ctx.lineTo(x, y + height);
             ctx.closePath();
             ctx.fill();
-
-            ctx.shadowBlur = 0;
         }}
 
         // Light direction — tweak x/y to move the "sun"
@@ -926,84 +1398,186 @@ html = f"""<!DOCTYPE html>
             return dot > 0 ? colors.left : colors.right;
         }}
 
-        // === DRAW AN ISOMETRIC BUILDING (PIXEL ART STYLE) ===
-        function drawBuildingPoly(building) {{
-            const coords = building.coords;
-            if (coords.length < 3) return;
+        // === BUILDING SPRITE CACHE ===
+        // A building only changes shape when the zoom changes — panning just
+        // slides it around. So each building is painted once per zoom level
+        // into its own small canvas, and later frames stamp that canvas in place.
+        const SPRITE_PAD = 12;  // Room for outlines, sign glow and rooftop masts
+        const buildingSprites = new Map();
+        let buildingSpritesZoom = null;
+
+        // Scratch corner arrays shared by every building (grown on demand):
+        // ground corners gX/gY, and roof corners gX/rY — a roof corner sits
+        // straight above its ground corner, so it shares the same x
+        let gX = new Float64Array(64), gY = new Float64Array(64), rY = new Float64Array(64);
+
+        // Takes a building number: the per-render work reads the typed
+        // building columns and coordBuffer directly
+        function drawBuildingPoly(b) {{
+            const start = buildingCoordStart[b];
+            const n = (buildingCoordEnd[b] - start) / 2;
+            if (n < 3) return;  // Need at least 3 corners
+
+            // Skip buildings that are entirely off screen before any per-corner
+            // work (padded like the sprites, for signs and rooftop masts)
+            if (offLayer(buildingBounds, 4 * b, SPRITE_PAD, buildingHeight[b])) return;
+
+            // Sprites are only valid for the zoom they were painted at
+            if (buildingSpritesZoom !== camera.zoom) {{
+                buildingSprites.clear();
+                buildingSpritesZoom = camera.zoom;
+            }}
 
-            // Height scaled for the tiny canvas
-            const height = (building.height * camera.zoom) / PIXEL_SCALE;
-            const colors = getBuildingColors(building);
+            // The first ground corner pins the sprite to the current pan
+            toIsoInto(coordBuffer[start], coordBuffer[start + 1], ISO_TMP);
+            const anchorX = ISO_TMP[0], anchorY = ISO_TMP[1];
+            const sprite = buildingSprites.get(b);
+            if (sprite) {{
+                addHitBox(buildings[b],
+                          anchorX + sprite.minX, anchorY + sprite.minY,
+                          anchorX + sprite.maxX, anchorY + sprite.maxY);
+                ctx.drawImage(sprite.canvas, anchorX + sprite.left, anchorY + sprite.top);
+                return;
+            }}
+
+            // Height scaled for the tiny canvas (whole pixels, like the corners)
+            const height = Math.round((buildingHeight[b] * camera.zoom) / PIXEL_SCALE);
+            if (gX.length < n) {{
+                gX = new Float64Array(n * 2);
+                gY = new Float64Array(n * 2);
+                rY = new Float64Array(n * 2);
+            }}
+
+            // Project the corners and record the screen-space bounding box
+            // for click detection in the same pass
+            let minX = Infinity, maxX = -Infinity, minY = Infinity, maxY = -Infinity;
+            const {{ ax, ay, ox, oy }} = isoProj;
+            for (let i = 0; i < n; i++) {{
+                const x = coordBuffer[start + 2 * i], y = coordBuffer[start + 2 * i + 1];
+                // Same (pixel-snapped) math as toIso
+                gX[i] = Math.round((x - y) * ax + ox);
+                gY[i] = Math.round((x + y) * ay + oy);
+                rY[i] = gY[i] - height;
+                if (gX[i] < minX) minX = gX[i];
+                if (gX[i] > maxX) maxX = gX[i];
+                if (gY[i] < minY) minY = gY[i];
+                if (gY[i] > maxY) maxY = gY[i];
+                if (rY[i] < minY) minY = rY[i];
+                if (rY[i] > maxY) maxY = rY[i];
+            }}
+            addHitBox(buildings[b], minX, minY, maxX, maxY);
+
+            // Only buildings that are on screen get a sprite, so the cache
+            // holds about one screenful of pixels however far you zoom in
+            if (maxX < 0 || minX >= offscreen.width || maxY < 0 || minY >= offscreen.height) {{
+                paintBuilding(ctx, b);
+                return;
+            }}
 
-            const groundPts = coords.map(c => toIso(c.x, c.y));
-            const roofPts = coords.map(c => {{
-                const iso = toIso(c.x, c.y);
-                return {{ x: iso.x, y: iso.y - height }};
+            const left = Math.floor(minX) - SPRITE_PAD;
+            const top = Math.floor(minY) - SPRITE_PAD;
+            const spriteCanvas = document.createElement('canvas');
+            spriteCanvas.width = Math.ceil(maxX) + SPRITE_PAD - left;
+            spriteCanvas.height = Math.ceil(maxY) + SPRITE_PAD - top;
+            const spriteCtx = spriteCanvas.getContext('2d');
+            spriteCtx.imageSmoothingEnabled = false;
+            // Paint in screen coordinates, shifted so (left, top) lands at 0,0
+            spriteCtx.translate(-left, -top);
+            paintBuilding(spriteCtx, b);
+
+            buildingSprites.set(b, {{
+                canvas: spriteCanvas,
+                left: left - anchorX, top: top - anchorY,
+                minX: minX - anchorX, minY: minY - anchorY,
+                maxX: maxX - anchorX, maxY: maxY - anchorY,
             }});
+            ctx.drawImage(spriteCanvas, left, top);
+        }}
 
-            // Record screen-space bounding box for click detection
-            const allPts = [...groundPts, ...roofPts];
-            const minX = Math.min(...allPts.map(p => p.x));
-            const maxX = Math.max(...allPts.map(p => p.x));
-            const minY = Math.min(...allPts.map(p => p.y));
-            const maxY = Math.max(...allPts.map(p => p.y));
-            buildingHitBoxes.push({{ building, minX, minY, maxX, maxY }});
+        // === PAINT AN ISOMETRIC BUILDING (PIXEL ART STYLE) ===
+        // Draws onto the given context, which is either the main canvas or a
+        // building's sprite canvas. Corners come from the gX/gY/rY scratch
+        // arrays that drawBuildingPoly just filled.
+        function paintBuilding(ctx, b) {{
+            const building = buildings[b];
+            const coords = building.coords;
+            const n = coords.length / 2;
+            const levels = buildingLevels[b];
+            const colors = building._colors;
+            const colorsDark = building._colorsDark;
 
             // Should we draw details? (skip when zoomed out too far)
-            const drawDetails = (camera.zoom / PIXEL_SCALE) > 0.3 && building.levels >= 2;
+            const drawDetails = zoomScale > 0.3 && levels >= 2;
 
             // Draw ground fill
             ctx.beginPath();
-            ctx.moveTo(groundPts[0].x, groundPts[0].y);
-            for (let i = 1; i < groundPts.length; i++) {{
-                ctx.lineTo(groundPts[i].x, groundPts[i].y);
+            ctx.moveTo(gX[0], gY[0]);
+            for (let i = 1; i < n; i++) {{
+                ctx.lineTo(gX[i], gY[i]);
             }}
             ctx.closePath();
-            ctx.fillStyle = colors.right;
+            ctx.fillStyle = hslString(colors.right);
             ctx.fill();
 
             // === PASS 1: Fill walls (no outlines yet) ===
-            for (let i = 0; i < coords.length - 1; i++) {{
-                const g1 = groundPts[i];
-                const g2 = groundPts[i + 1];
-                const r1 = roofPts[i];
-                const r2 = roofPts[i + 1];
-
-                ctx.beginPath();
-                ctx.moveTo(g1.x, g1.y);
-                ctx.lineTo(g2.x, g2.y);
-                ctx.lineTo(r2.x, r2.y);
-                ctx.lineTo(r1.x, r1.y);
-                ctx.closePath();
+            // Every wall is either the lit or the shaded color, so collect the
+            // quads into one path per color: 2 fills instead of one per wall.
+            // Pass 3 strokes the very same paths for the outlines.
+            //
+            // Walls on the far side of the building face away from the camera
+            // and end up hidden behind the front walls and the roof, so they
+            // are skipped entirely. A wall faces the camera when its outward
+            // normal points down the screen; which side is "outward" depends on
+            // the winding of the footprint, worked out once at load. A
+            // footprint too thin to have a winding keeps all of its walls.
+            const winding = building._winding;
+            const leftWalls = new Path2D();
+            const rightWalls = new Path2D();
+            const wallColors = new Array(n - 1);  // Reused by the details pass (null = culled)
+            for (let i = 0; i < n - 1; i++) {{
+                if (winding !== 0 && (gX[i + 1] - gX[i]) * winding >= 0) {{
+                    wallColors[i] = null;
+                    continue;
+                }}
 
                 // Fixed light direction: consistent shadows across ALL buildings
-                const dx = coords[i + 1].x - coords[i].x;
-                const dy = coords[i + 1].y - coords[i].y;
-                ctx.fillStyle = getWallColor(dx, dy, colors);
-                ctx.fill();
+                const dx = coords[2 * i + 2] - coords[2 * i];
+                const dy = coords[2 * i + 3] - coords[2 * i + 1];
+                wallColors[i] = getWallColor(dx, dy, colors);
+                const walls = wallColors[i] === colors.left ? leftWalls : rightWalls;
+
+                walls.moveTo(gX[i], gY[i]);
+                walls.lineTo(gX[i + 1], gY[i + 1]);
+                walls.lineTo(gX[i + 1], rY[i + 1]);
+                walls.lineTo(gX[i], rY[i]);
+                walls.closePath();
             }}
+            ctx.fillStyle = hslString(colors.left);
+            ctx.fill(leftWalls);
+            ctx.fillStyle = hslString(colors.right);
+            ctx.fill(rightWalls);
 
             // === PASS 2: Draw building details (on top of wall fill) ===
             if (drawDetails) {{
-                for (let i = 0; i < coords.length - 1; i++) {{
-                    const g1 = groundPts[i];
-                    const g2 = groundPts[i + 1];
-                    const r1 = roofPts[i];
-                    const r2 = roofPts[i + 1];
+                for (let i = 0; i < n - 1; i++) {{
+                    const wallColor = wallColors[i];
+                    if (wallColor === null) continue;  // Back-facing wall
 
-                    const dx = coords[i + 1].x - coords[i].x;
-                    const dy = coords[i + 1].y - coords[i].y;
-                    const wallColor = getWallColor(dx, dy, colors);
+                    // Corner points of this wall for the interpolation helpers
+                    const g1 = {{ x: gX[i], y: gY[i] }};
+                    const g2 = {{ x: gX[i + 1], y: gY[i + 1] }};
+                    const r1 = {{ x: gX[i], y: rY[i] }};
+                    const r2 = {{ x: gX[i + 1], y: rY[i + 1] }};
 
                     // --- Ground floor accent (usage-aware) ---
                     const isShop = building.usage === 'shop' || building.usage === 'commercial'
                                 || building.usage === 'shop_house' || building.usage === 'shop_apartment';
                     const isOffice = building.usage === 'office';
                     // Shops get a taller, brighter ground floor (storefront)
-                    const gfRatio = isShop ? Math.min(0.3, 2 / building.levels)
-                                           : 1 / building.levels;
-                    const gfTL = bilinearPoint(g1, g2, r1, r2, 0, gfRatio);
-                    const gfTR = bilinearPoint(g1, g2, r1, r2, 1, gfRatio);
+                    const gfRatio = isShop ? Math.min(0.3, 2 / levels)
+                                           : 1 / levels;
+                    const gfTL = bilinearLeftEdge(g1, r1, gfRatio);
+                    const gfTR = bilinearRightEdge(g2, r2, gfRatio);
 
                     ctx.beginPath();
                     ctx.moveTo(g1.x, g1.y);
@@ -1012,29 +1586,29 @@ html = f"""<!DOCTYPE html>
                     ctx.lineTo(gfTL.x, gfTL.y);
                     ctx.closePath();
                     // Shops = bright warm storefront, Offices = blue glass lobby
-                    ctx.fillStyle = isShop ? adjustHSL(wallColor, 14)
+                    ctx.fillStyle = hslString(isShop ? adjustHSL(wallColor, 14)
                                  : isOffice ? adjustHSL(PALETTE.window.ground, -10)
-                                 : adjustHSL(wallColor, 8);
+                                 : adjustHSL(wallColor, 8));
                     ctx.fill();
 
                     // --- Ground floor entrance window ---
-                    const entrancePt = bilinearPoint(g1, g2, r1, r2, 0.5, gfRatio * 0.5);
+                    const entrancePt = bilinearMid(g1, g2, r1, r2, gfRatio * 0.5);
                     ctx.fillStyle = isShop ? "#FFCC44" : PALETTE.window.ground;
                     ctx.fillRect(Math.round(entrancePt.x) - 1, Math.round(entrancePt.y), 2, 1);
 
                     // --- Floor separator lines ---
-                    for (let floor = 1; floor < building.levels; floor++) {{
-                        const v = floor / building.levels;
-                        const lineL = bilinearPoint(g1, g2, r1, r2, 0, v);
-                        const lineR = bilinearPoint(g1, g2, r1, r2, 1, v);
-
-                        ctx.beginPath();
-                        ctx.moveTo(lineL.x, lineL.y);
-                        ctx.lineTo(lineR.x, lineR.y);
-                        ctx.strokeStyle = PALETTE.floorLine;
-                        ctx.lineWidth = 1;
-                        ctx.stroke();
+                    // All in one color, so the whole wall's lines take 1 stroke
+                    const floorLines = new Path2D();
+                    for (let floor = 1; floor < levels; floor++) {{
+                        const v = floor / levels;
+                        const lineL = bilinearLeftEdge(g1, r1, v);
+                        const lineR = bilinearRightEdge(g2, r2, v);
+                        floorLines.moveTo(lineL.x, lineL.y);
+                        floorLines.lineTo(lineR.x, lineR.y);
                     }}
+                    ctx.strokeStyle = PALETTE.floorLine;
+                    ctx.lineWidth = 1;
+                    ctx.stroke(floorLines);
 
                     // --- Windows ---
                     // Window lit/dim pattern
@@ -1053,36 +1627,49 @@ html = f"""<!DOCTYPE html>
                     //   - All lit:        true
                     // Window density varies by building type
                     const windowsPerFloor = isOffice ? 3 : isShop ? 1 : 2;
-                    for (let floor = 1; floor < building.levels; floor++) {{
+                    // Space windows evenly across the wall. Each window column
+                    // sits at a fixed u, so interpolate its bottom and top once
+                    // and only step up the column per floor.
+                    const columns = [];
+                    for (let w = 0; w < windowsPerFloor; w++) {{
+                        const u = (w + 1) / (windowsPerFloor + 1);
+                        columns.push({{ bottom: lerpPoint(g1, g2, u), top: lerpPoint(r1, r2, u) }});
+                    }}
+                    // Lit and dim windows are collected into one path each, so
+                    // the whole wall's windows take 2 fills
+                    const litWindows = new Path2D();
+                    const dimWindows = new Path2D();
+                    for (let floor = 1; floor < levels; floor++) {{
+                        const vCenter = (floor + 0.5) / levels;
                         for (let w = 0; w < windowsPerFloor; w++) {{
-                            // Space windows evenly across the wall
-                            const u = (w + 1) / (windowsPerFloor + 1);
-                            const vCenter = (floor + 0.5) / building.levels;
-                            const pt = bilinearPoint(g1, g2, r1, r2, u, vCenter);
+                            const pt = lerpPoint(columns[w].bottom, columns[w].top, vCenter);
 
                             // Determine if window is lit or dim
                             const isLit = (i * 7 + floor * 3 + w) % 3 !== 0;
-                            ctx.fillStyle = isLit ? PALETTE.window.lit : PALETTE.window.dim;
-                            ctx.fillRect(Math.round(pt.x), Math.round(pt.y), 1, 1);
+                            (isLit ? litWindows : dimWindows).rect(Math.round(pt.x), Math.round(pt.y), 1, 1);
                         }}
                     }}
+                    ctx.fillStyle = PALETTE.window.lit;
+                    ctx.fill(litWindows);
+                    ctx.fillStyle = PALETTE.window.dim;
+                    ctx.fill(dimWindows);
                 }}
             }}
 
             // === BILLBOARD PASS: Neon signs on hero buildings ===
-            // Uses drawShibuyaSign() for skewed parallelogram with shadowBlur glow
+            // Uses drawShibuyaSign() for skewed parallelogram over a cached glow sprite
             if (building.hero && building.hero.billboards && drawDetails) {{
                 // Find the widest wall face to place the sign on
                 let bestWall = 0;
                 let bestWidth = 0;
-                for (let i = 0; i < coords.length - 1; i++) {{
-                    const w = Math.abs(groundPts[i + 1].x - groundPts[i].x)
-                            + Math.abs(groundPts[i + 1].y - groundPts[i].y);
+                for (let i = 0; i < n - 1; i++) {{
+                    const w = Math.abs(gX[i + 1] - gX[i])
+                            + Math.abs(gY[i + 1] - gY[i]);
                     if (w > bestWidth) {{ bestWidth = w; bestWall = i; }}
                 }}
                 const wi = bestWall;
-                const g1 = groundPts[wi], g2 = groundPts[wi + 1];
-                const r1 = roofPts[wi], r2 = roofPts[wi + 1];
+                const g1 = {{ x: gX[wi], y: gY[wi] }}, g2 = {{ x: gX[wi + 1], y: gY[wi + 1] }};
+                const r1 = {{ x: gX[wi], y: rY[wi] }}, r2 = {{ x: gX[wi + 1], y: rY[wi + 1] }};
 
                 for (const bb of building.hero.billboards) {{
                     // Map billboard UV coords to the wall face position
@@ -1092,86 +1679,65 @@ html = f"""<!DOCTYPE html>
                     const signW = Math.abs(tr.x - tl.x) + 1;
                     const signH = Math.abs(bl.y - tl.y) + 1;
 
+                    drawSignGlow(ctx, tl.x, tl.y, signW, signH, bb.color);
                     drawShibuyaSign(ctx, tl.x, tl.y, signW, signH, bb.color);
                 }}
             }}
 
             // === PASS 3: Wall outlines (selective color, not pure black) ===
-            for (let i = 0; i < coords.length - 1; i++) {{
-                const g1 = groundPts[i];
-                const g2 = groundPts[i + 1];
-                const r1 = roofPts[i];
-                const r2 = roofPts[i + 1];
-
-                ctx.beginPath();
-                ctx.moveTo(g1.x, g1.y);
-                ctx.lineTo(g2.x, g2.y);
-                ctx.lineTo(r2.x, r2.y);
-                ctx.lineTo(r1.x, r1.y);
-                ctx.closePath();
-                // 30% darker than wall face — professional pixel art style
-                const dx = coords[i + 1].x - coords[i].x;
-                const dy = coords[i + 1].y - coords[i].y;
-                ctx.strokeStyle = adjustHSL(getWallColor(dx, dy, colors), -20);
-                ctx.lineWidth = 1;
-                ctx.stroke();
-            }}
+            // 30% darker than wall face — professional pixel art style
+            ctx.lineWidth = 1;
+            ctx.strokeStyle = hslString(colorsDark.left);
+            ctx.stroke(leftWalls);
+            ctx.strokeStyle = hslString(colorsDark.right);
+            ctx.stroke(rightWalls);
 
             // === PASS 4: Roof with outline + dithered texture ===
-            ctx.beginPath();
-            ctx.moveTo(roofPts[0].x, roofPts[0].y);
-            for (let i = 1; i < roofPts.length; i++) {{
-                ctx.lineTo(roofPts[i].x, roofPts[i].y);
-            }}
-            ctx.closePath();
-            ctx.fillStyle = colors.top;
-            ctx.fill();
-
-            // Dithered texture overlay on larger roofs (pixel art technique)
+            // Larger roofs get a dithered texture (pixel art technique). The
+            // dither pattern already holds both the base and the darker roof
+            // color, so it replaces the plain fill instead of being clipped
+            // on top of it.
+            let roofFill = hslString(colors.top);
             if (drawDetails) {{
                 // Estimate roof area with shoelace formula
                 let roofArea = 0;
-                for (let i = 0; i < roofPts.length; i++) {{
-                    const j = (i + 1) % roofPts.length;
-                    roofArea += roofPts[i].x * roofPts[j].y;
-                    roofArea -= roofPts[j].x * roofPts[i].y;
+                for (let i = 0; i < n; i++) {{
+                    const j = (i + 1) % n;
+                    roofArea += gX[i] * rY[j];
+                    roofArea -= gX[j] * rY[i];
                 }}
                 roofArea = Math.abs(roofArea) / 2;
 
                 if (roofArea > 15) {{
-                    ctx.save();
-                    // Re-create the roof clip path
-                    ctx.beginPath();
-                    ctx.moveTo(roofPts[0].x, roofPts[0].y);
-                    for (let i = 1; i < roofPts.length; i++) {{
-                        ctx.lineTo(roofPts[i].x, roofPts[i].y);
-                    }}
-                    ctx.closePath();
-                    ctx.clip();
-                    const dither = getDitherPattern(colors.top, adjustHSL(colors.top, -6));
-                    if (dither) {{
-                        ctx.fillStyle = dither;
-                        ctx.fill();
-                    }}
-                    ctx.restore();
+                    roofFill = getDitherPattern(roofFill, hslString(adjustHSL(colors.top, -6))) || roofFill;
                 }}
             }}
+            // One roof path serves both the fill and the outline
+            const roofPath = new Path2D();
+            roofPath.moveTo(gX[0], rY[0]);
+            for (let i = 1; i < n; i++) {{
+                roofPath.lineTo(gX[i], rY[i]);
+            }}
+            roofPath.closePath();
+            ctx.fillStyle = roofFill;
+            ctx.fill(roofPath);
 
             // Roof outline
-            ctx.beginPath();
-            ctx.moveTo(roofPts[0].x, roofPts[0].y);
-            for (let i = 1; i < roofPts.length; i++) {{
-                ctx.lineTo(roofPts[i].x, roofPts[i].y);
-            }}
-            ctx.closePath();
-            ctx.strokeStyle = adjustHSL(colors.top, -20);
+            ctx.strokeStyle = hslString(colorsDark.top);
             ctx.lineWidth = 1;
-            ctx.stroke();
+            ctx.stroke(roofPath);
 
             // === ROOFTOP DETAILS for hero buildings ===
+            // Rects that share a color go into one path and one fill. They
+            // can't be batched across buildings: nearer ones must cover them
             if (building.hero && building.hero.rooftop && drawDetails) {{
-                const rcx = roofPts.reduce((s, p) => s + p.x, 0) / roofPts.length;
-                const rcy = roofPts.reduce((s, p) => s + p.y, 0) / roofPts.length;
+                let sumX = 0, sumY = 0;
+                for (let i = 0; i < n; i++) {{
+                    sumX += gX[i];
+                    sumY += rY[i];
+                }}
+                const rcx = sumX / n;
+                const rcy = sumY / n;
                 const rx = Math.round(rcx);
                 const ry = Math.round(rcy);
 
@@ -1181,8 +1747,10 @@ html = f"""<!DOCTYPE html>
                         ctx.fillStyle = '#888888';
                         ctx.fillRect(rx, ry - 8, 1, 8);
                         ctx.fillStyle = '#AAAAAA';
-                        ctx.fillRect(rx - 1, ry - 7, 3, 1);
-                        ctx.fillRect(rx - 1, ry - 5, 3, 1);
+                        ctx.beginPath();
+                        ctx.rect(rx - 1, ry - 7, 3, 1);
+                        ctx.rect(rx - 1, ry - 5, 3, 1);
+                        ctx.fill();
                         // Red warning light at top
                         ctx.fillStyle = '#FF3333';
                         ctx.fillRect(rx, ry - 9, 1, 1);
@@ -1192,9 +1760,11 @@ html = f"""<!DOCTYPE html>
                         ctx.fillStyle = '#333333';
                         ctx.fillRect(rx - 3, ry - 2, 6, 4);
                         ctx.fillStyle = '#FFFFFF';
-                        ctx.fillRect(rx - 2, ry - 1, 1, 3);
-                        ctx.fillRect(rx + 1, ry - 1, 1, 3);
-                        ctx.fillRect(rx - 1, ry, 3, 1);
+                        ctx.beginPath();
+                        ctx.rect(rx - 2, ry - 1, 1, 3);
+                        ctx.rect(rx + 1, ry - 1, 1, 3);
+                        ctx.rect(rx - 1, ry, 3, 1);
+                        ctx.fill();
                         break;
                     case 'screen':
                         // Glowing LED screen on roof
@@ -1208,8 +1778,10 @@ html = f"""<!DOCTYPE html>
                     case 'billboard_top':
                         // Vertical sign sticking up from roof
                         ctx.fillStyle = '#444444';
-                        ctx.fillRect(rx - 1, ry - 5, 1, 4);
-                        ctx.fillRect(rx + 1, ry - 5, 1, 4);
+                        ctx.beginPath();
+                        ctx.rect(rx - 1, ry - 5, 1, 4);
+                        ctx.rect(rx + 1, ry - 5, 1, 4);
+                        ctx.fill();
                         ctx.fillStyle = building.hero.accent;
                         ctx.fillRect(rx - 2, ry - 7, 5, 3);
                         break;
@@ -1224,34 +1796,80 @@ html = f"""<!DOCTYPE html>
             }}
         }}
 
-        // === DRAW BUILDING LABEL (pixel font) ===
-        function drawLabel(building) {{
-            if (!building.name) return;
-            const iso = toIso(building.x, building.y);
-            const labelY = iso.y - (building.height * camera.zoom / PIXEL_SCALE) - 4;
+        // === PIXEL FONTS ===
+        // Every font size follows the zoom, so the font strings are only
+        // rebuilt when the zoom changes instead of once per label per frame
+        let fonts = null;
+        function updateFonts() {{
+            const z = camera.zoom;
+            if (fonts && fonts.zoom === z) return;
+            const roadSize = Math.max(4, Math.floor(3 * z));
+            const parkSize = Math.max(3, Math.floor(3 * z / PIXEL_SCALE));
+            fonts = {{
+                zoom: z,
+                roadSize, parkSize,  // In pixels, for culling labels
+                label: `${{Math.max(5, Math.floor(4 * z))}}px monospace`,
+                scramble: `bold ${{Math.max(5, Math.floor(5 * z))}}px monospace`,
+                road: `${{roadSize}}px monospace`,
+                station: `bold ${{Math.max(4, Math.floor(4 * z))}}px monospace`,
+                park: `${{parkSize}}px monospace`,
+            }};
+        }}
 
-            // Pixel-perfect monospace font at small size
-            ctx.font = `${{Math.max(5, Math.floor(4 * camera.zoom))}}px monospace`;
-            ctx.fillStyle = "#dddddd";
-            ctx.textAlign = "center";
-            ctx.fillText(building.name, iso.x, labelY);
+        // === DRAW BUILDING LABEL (pixel font) ===
+        // render() sets the label font and color once for all labels.
+        // Only a handful of buildings have names, so the label pass walks
+        // just those (still far to near, like the buildings themselves).
+        // Building numbers, like drawBuildingPoly takes
+        const namedBuildings = Int32Array.from(
+            buildings.flatMap((building, i) => building.name ? [i] : []));
+
+        function drawLabel(b) {{
+            const name = buildings[b].name;
+            if (!name) return;
+            toIsoInto(buildingX[b], buildingY[b], ISO_TMP);
+            const labelY = ISO_TMP[1] - (buildingHeight[b] * camera.zoom / PIXEL_SCALE) - 4;
+            ctx.fillText(name, ISO_TMP[0], labelY);
         }}
 
         // === DRAW SCRAMBLE CROSSING (pixel art) ===
-        function drawScrambleCrossing() {{
-            if (scrambleArea.length >= 3) {{
+        // The crossing never moves, so its center is found once, and its
+        // projected shapes are only rebuilt after the camera moves
+        let scrambleCentroid = null;
+        if (scrambleArea.length >= 3) {{
+            const n = scrambleArea.length;
+            let sx = 0, sy = 0;
+            for (let i = 0; i < n; i++) {{
+                sx += scrambleArea[i].x;
+                sy += scrambleArea[i].y;
+            }}
+            scrambleCentroid = {{ x: sx / n, y: sy / n }};
+        }}
+        const scrambleShapes = {{ version: -1, area: null, stripes: null, label: null }};
+
+        function updateScrambleShapes() {{
+            if (scrambleShapes.version === cameraVersion) return;
+            scrambleShapes.version = cameraVersion;
+
+            if (scrambleCentroid) {{
                 const pts = scrambleArea.map(c => toIso(c.x, c.y));
-                ctx.beginPath();
-                ctx.moveTo(pts[0].x, pts[0].y);
+                const area = new Path2D();
+                area.moveTo(pts[0].x, pts[0].y);
                 for (let i = 1; i < pts.length; i++) {{
-                    ctx.lineTo(pts[i].x, pts[i].y);
+                    area.lineTo(pts[i].x, pts[i].y);
                 }}
-                ctx.closePath();
-                ctx.fillStyle = PALETTE.crossing;
-                ctx.fill();
+                area.closePath();
+                scrambleShapes.area = area;
+                scrambleShapes.label = toIso(scrambleCentroid.x, scrambleCentroid.y);
             }}
 
             // Zebra stripes — solid white pixels, no transparency
+            // Each stripe is stripeW wide with a 1px gap, laid across the
+            // crossing line. That is exactly a dashed stroke along the line
+            // itself, halfW * 2 thick — so every crossing goes into one path
+            // and the whole zebra is a single stroke.
+            const stripeW = Math.max(1, Math.floor(camera.zoom));
+            const stripes = new Path2D();
             for (const crossing of scrambleCrossings) {{
                 const pts = crossing.map(c => toIso(c.x, c.y));
                 if (pts.length < 2) continue;
@@ -1260,124 +1878,143 @@ html = f"""<!DOCTYPE html>
                     const dx = pts[i+1].x - pts[i].x;
                     const dy = pts[i+1].y - pts[i].y;
                     const len = Math.sqrt(dx * dx + dy * dy);
-                    const nx = -dy / len;
-                    const ny = dx / len;
-                    const stripeW = Math.max(1, Math.floor(camera.zoom));
-                    const halfW = Math.max(1, Math.floor(2 * camera.zoom / PIXEL_SCALE));
                     const numStripes = Math.floor(len / (stripeW + 1));
-
-                    for (let s = 0; s < numStripes; s++) {{
-                        const t = (s * (stripeW + 1)) / len;
-                        const cx = pts[i].x + dx * t;
-                        const cy = pts[i].y + dy * t;
-
-                        ctx.beginPath();
-                        ctx.moveTo(cx + nx * halfW, cy + ny * halfW);
-                        ctx.lineTo(cx - nx * halfW, cy - ny * halfW);
-                        ctx.strokeStyle = PALETTE.stripe;
-                        ctx.lineWidth = stripeW;
-                        ctx.lineCap = "butt";
-                        ctx.stroke();
-                    }}
+                    if (numStripes === 0) continue;
+
+                    // Stripe s is centered at s * (stripeW + 1) along the segment
+                    const ux = dx / len;
+                    const uy = dy / len;
+                    const start = -stripeW / 2;
+                    const end = numStripes * (stripeW + 1) - 1 - stripeW / 2;
+                    stripes.moveTo(pts[i].x + ux * start, pts[i].y + uy * start);
+                    stripes.lineTo(pts[i].x + ux * end, pts[i].y + uy * end);
                 }}
             }}
+            scrambleShapes.stripes = stripes;
+        }}
+
+        function drawScrambleCrossing() {{
+            updateScrambleShapes();
+            if (scrambleShapes.area) {{
+                ctx.fillStyle = PALETTE.crossing;
+                ctx.fill(scrambleShapes.area);
+            }}
+
+            const stripeW = Math.max(1, Math.floor(camera.zoom));
+            const halfW = Math.max(1, Math.floor(2 * camera.zoom / PIXEL_SCALE));
+            ctx.setLineDash([stripeW, 1]);
+            ctx.strokeStyle = PALETTE.stripe;
+            ctx.lineWidth = halfW * 2;
+            ctx.lineCap = "butt";
+            ctx.stroke(scrambleShapes.stripes);
+            ctx.setLineDash([]);
 
             // Label
-            if (scrambleArea.length >= 3) {{
-                const cx = scrambleArea.reduce((s, c) => s + c.x, 0) / scrambleArea.length;
-                const cy = scrambleArea.reduce((s, c) => s + c.y, 0) / scrambleArea.length;
-                const iso = toIso(cx, cy);
-                ctx.font = `bold ${{Math.max(5, Math.floor(5 * camera.zoom))}}px monospace`;
+            if (scrambleShapes.label) {{
+                ctx.font = fonts.scramble;
                 ctx.fillStyle = "#999999";
-                ctx.textAlign = "center";
-                ctx.fillText("SHIBUYA CROSSING", iso.x, iso.y);
+                ctx.fillText("SHIBUYA CROSSING", scrambleShapes.label.x, scrambleShapes.label.y);
             }}
         }}
 
+        // === ROAD STYLE BUCKETS ===
+        // Roads with the same width and center-line rule are stroked with the
+        // exact same styles, so each bucket draws all its roads as one path
+        function bucketRoads() {{
+            const buckets = new Map();
+            for (const road of roads) {{
+                if (road.coords.length < 4) continue;
+                const dashed = road.type !== "footway" && road.type !== "pedestrian";
+                const key = road.width + "|" + dashed;
+                if (!buckets.has(key)) {{
+                    buckets.set(key, {{ width: road.width, dashed, roads: [], path: null, pathVersion: -1 }});
+                }}
+                buckets.get(key).roads.push(road);
+            }}
+            return [...buckets.values()];
+        }}
+        const roadBuckets = bucketRoads();
+
+        // All of a bucket's on-layer polylines in one Path2D (rebuilt after
+        // camera moves)
+        function roadBucketPath(bucket) {{
+            if (bucket.pathVersion !== cameraVersion) {{
+                const path = new Path2D();
+                const pad = Math.max(1, Math.floor(bucket.width * camera.zoom / PIXEL_SCALE)) + 1;
+                for (const road of bucket.roads) {{
+                    if (offLayer(road._isoBounds, 0, pad)) continue;
+                    const pts = isoCoords(road);
+                    path.moveTo(pts[0], pts[1]);
+                    for (let i = 2; i < pts.length; i += 2) {{
+                        path.lineTo(pts[i], pts[i + 1]);
+                    }}
+                }}
+                bucket.path = path;
+                bucket.pathVersion = cameraVersion;
+            }}
+            return bucket.path;
+        }}
+
         // === DRAW ROADS (pixel art — solid colors, no transparency) ===
         function drawRoads() {{
-            for (const road of roads) {{
-                const pts = road.coords.map(c => toIso(c.x, c.y));
-                if (pts.length < 2) continue;
+            ctx.lineCap = "square";  // Square caps = pixel perfect!
+            ctx.lineJoin = "miter";
 
+            // Every border goes down first, then every fill on top, so road
+            // fills run cleanly through junctions
+            ctx.strokeStyle = PALETTE.roadEdge;
+            for (const bucket of roadBuckets) {{
                 // Road width scaled down for tiny canvas
-                const w = Math.max(1, Math.floor(road.width * camera.zoom / PIXEL_SCALE));
-
-                // Draw road border
-                ctx.beginPath();
-                ctx.moveTo(pts[0].x, pts[0].y);
-                for (let i = 1; i < pts.length; i++) {{
-                    ctx.lineTo(pts[i].x, pts[i].y);
-                }}
-                ctx.strokeStyle = PALETTE.roadEdge;
+                const w = Math.max(1, Math.floor(bucket.width * camera.zoom / PIXEL_SCALE));
                 ctx.lineWidth = w + 1;
-                ctx.lineCap = "square";  // Square caps = pixel perfect!
-                ctx.lineJoin = "miter";
-                ctx.stroke();
-
-                // Draw road fill
-                ctx.beginPath();
-                ctx.moveTo(pts[0].x, pts[0].y);
-                for (let i = 1; i < pts.length; i++) {{
-                    ctx.lineTo(pts[i].x, pts[i].y);
-                }}
-                ctx.strokeStyle = PALETTE.road;
-                ctx.lineWidth = w;
-                ctx.lineCap = "square";
-                ctx.lineJoin = "miter";
-                ctx.stroke();
+                ctx.stroke(roadBucketPath(bucket));
+            }}
+            ctx.strokeStyle = PALETTE.road;
+            for (const bucket of roadBuckets) {{
+                ctx.lineWidth = Math.max(1, Math.floor(bucket.width * camera.zoom / PIXEL_SCALE));
+                ctx.stroke(roadBucketPath(bucket));
+            }}
 
-                // Dashed center line for wider roads (pixel-perfect dashes)
-                if (road.type !== "footway" && road.type !== "pedestrian" && w > 2) {{
-                    ctx.beginPath();
-                    ctx.setLineDash([2, 3]);
-                    ctx.moveTo(pts[0].x, pts[0].y);
-                    for (let i = 1; i < pts.length; i++) {{
-                        ctx.lineTo(pts[i].x, pts[i].y);
-                    }}
-                    ctx.strokeStyle = "#444455";
-                    ctx.lineWidth = 1;
-                    ctx.stroke();
-                    ctx.setLineDash([]);
-                }}
+            // Dashed center line for wider roads (pixel-perfect dashes)
+            ctx.setLineDash([2, 3]);
+            ctx.strokeStyle = "#444455";
+            ctx.lineWidth = 1;
+            for (const bucket of roadBuckets) {{
+                const w = Math.max(1, Math.floor(bucket.width * camera.zoom / PIXEL_SCALE));
+                if (bucket.dashed && w > 2) ctx.stroke(roadBucketPath(bucket));
             }}
+            ctx.setLineDash([]);
 
             // Road names in pixel font
-            ctx.font = `${{Math.max(4, Math.floor(3 * camera.zoom))}}px monospace`;
+            ctx.font = fonts.road;
             ctx.fillStyle = "#777788";
-            ctx.textAlign = "center";
             for (const road of roads) {{
                 if (!road.name || road.type === "footway") continue;
-                const mid = Math.floor(road.coords.length / 2);
-                const pt = toIso(road.coords[mid].x, road.coords[mid].y);
-                ctx.fillText(road.name, pt.x, pt.y - 2);
+                // (a monospace glyph is at most 1em wide)
+                if (offLayer(road._isoBounds, 0, road.name.length * fonts.roadSize)) continue;
+                const pts = isoCoords(road);
+                const mid = Math.floor(pts.length / 4);
+                ctx.fillText(road.name, pts[2 * mid], pts[2 * mid + 1] - 2);
             }}
         }}
 
         // === DRAW RAILWAY LINES (real Tokyo line colors!) ===
         function drawRailways() {{
+            const bedWidth = Math.max(2, Math.floor(3 * camera.zoom / PIXEL_SCALE));
             for (const rail of railways) {{
-                const pts = rail.coords.map(c => toIso(c.x, c.y));
-                if (pts.length < 2) continue;
+                if (rail.coords.length < 4 || offLayer(rail._isoBounds, 0, bedWidth)) continue;
+                const pts = isoCoords(rail);
 
                 // Draw track bed (dark outline)
-                ctx.beginPath();
-                ctx.moveTo(pts[0].x, pts[0].y);
-                for (let i = 1; i < pts.length; i++) {{
-                    ctx.lineTo(pts[i].x, pts[i].y);
-                }}
+                traceIsoLine(pts);
                 ctx.strokeStyle = "#111111";
-                ctx.lineWidth = Math.max(2, Math.floor(3 * camera.zoom / PIXEL_SCALE));
+                ctx.lineWidth = bedWidth;
                 ctx.lineCap = "round";
                 ctx.lineJoin = "round";
                 ctx.stroke();
 
                 // Draw colored rail line
-                ctx.beginPath();
-                ctx.moveTo(pts[0].x, pts[0].y);
-                for (let i = 1; i < pts.length; i++) {{
-                    ctx.lineTo(pts[i].x, pts[i].y);
-                }}
+                traceIsoLine(pts);
                 ctx.strokeStyle = rail.color;
                 ctx.lineWidth = Math.max(1, Math.floor(2 * camera.zoom / PIXEL_SCALE));
                 ctx.lineCap = "round";
@@ -1388,6 +2025,7 @@ html = f"""<!DOCTYPE html>
 
         // === DRAW STATION MARKERS ===
         function drawStations() {{
+            ctx.font = fonts.station;
             for (const station of stations) {{
                 const pt = toIso(station.x, station.y);
                 const size = Math.max(2, Math.floor(3 * camera.zoom / PIXEL_SCALE));
@@ -1423,24 +2061,35 @@ html = f"""<!DOCTYPE html>
                 ctx.fillRect(pt.x - size + 1, pt.y - size + 1, size * 2 - 2, size * 2 - 2);
 
                 // Station name label
-                ctx.font = `bold ${{Math.max(4, Math.floor(4 * camera.zoom))}}px monospace`;
                 ctx.fillStyle = "#ffffff";
-                ctx.textAlign = "center";
                 ctx.fillText(station.name, pt.x, pt.y - size - 2);
             }}
         }}
 
         // === DRAW GSI SATELLITE GROUND TILES ===
         // Uses Canvas affine transforms to project rectangular tiles into isometric space
+        // All loaded tiles are composited into one layer first, then laid
+        // over the world in a single half-transparent draw (so where
+        // neighbouring tiles overlap by a pixel, the seam isn't blended twice)
+        const groundLayer = document.createElement('canvas');
+        const groundLayerCtx = groundLayer.getContext('2d');
+
         function drawGroundTiles() {{
             if (gsiTilesLoaded === 0) return;
 
-            ctx.save();
-            // Slightly darkened + desaturated to match pixel art aesthetic
-            ctx.globalAlpha = 0.5;
+            // Resizing reallocates the canvas, so only do it when the world
+            // layer itself changed size; otherwise just wipe the last frame
+            if (groundLayer.width !== offscreen.width || groundLayer.height !== offscreen.height) {{
+                groundLayer.width = offscreen.width;
+                groundLayer.height = offscreen.height;
+                groundLayerCtx.imageSmoothingEnabled = false;
+            }} else {{
+                groundLayerCtx.clearRect(0, 0, groundLayer.width, groundLayer.height);
+            }}
 
             for (const tile of gsiTiles) {{
-                if (!tile.img.complete) continue;
+                // A missing tile file is "complete" but broken — only draw loaded ones
+                if (!tile.loaded) continue;
 
                 // Convert tile corners to isometric screen positions
                 // Top-left corner of tile in our coordinate system
@@ -1460,26 +2109,58 @@ html = f"""<!DOCTYPE html>
                 const c = (down.x - origin.x) / tileSize;
                 const d = (down.y - origin.y) / tileSize;
 
-                ctx.setTransform(a, b, c, d, origin.x, origin.y);
-                ctx.drawImage(tile.img, 0, 0, tileSize, tileSize);
+                groundLayerCtx.setTransform(a, b, c, d, origin.x, origin.y);
+                groundLayerCtx.drawImage(tile.img, 0, 0, tileSize, tileSize);
             }}
+            groundLayerCtx.setTransform(1, 0, 0, 1, 0, 0);
 
-            ctx.restore();
-            // Reset transform (setTransform changes it globally)
-            ctx.setTransform(1, 0, 0, 1, 0, 0);
+            // Slightly darkened + desaturated to match pixel art aesthetic
+            ctx.globalAlpha = 0.5;
+            ctx.drawImage(groundLayer, 0, 0);
             ctx.globalAlpha = 1.0;
         }}
 
         // === MAIN RENDER (offscreen → display with pixel scaling) ===
         // === PARKS: Green patches on the ground ===
+        // Tree positions around a park's center: the same 4 sin/cos offsets
+        // for every park, so work them out once as flat [sin0, cos0, sin1, ...]
+        const TREE_OFFSETS = new Float64Array(8);
+        for (let t = 0; t < 4; t++) {{
+            TREE_OFFSETS[2 * t] = Math.sin(t * 2.1);
+            TREE_OFFSETS[2 * t + 1] = Math.cos(t * 2.1);
+        }}
+
+        // 1px sprites (park trees, pedestrians) are gathered into one path
+        // per color instead of a fillStyle change and fillRect per dot. Dots
+        // can overlap, so the sprites are walked back to front and each dot
+        // only goes in if no later dot already claimed its pixel, leaving the
+        // same picture as drawing them in order. Clear the set after each batch
+        const claimedPixels = new Set();  // pixel index (y * width + x)
+
+        function claimPixel(x, y) {{
+            if (x < 0 || y < 0 || x >= offscreen.width || y >= offscreen.height) return false;
+            const index = y * offscreen.width + x;
+            if (claimedPixels.has(index)) return false;
+            claimedPixels.add(index);
+            return true;
+        }}
+
         function drawParks() {{
+            ctx.font = fonts.park;
             for (const park of parks) {{
-                const iso = toIso(park.x, park.y);
+                toIsoInto(park.x, park.y, ISO_TMP);
                 // Size based on actual park area (sqrt scale)
                 const baseSize = Math.max(2, Math.floor(Math.sqrt(park.area) * 0.008
                                  * camera.zoom / PIXEL_SCALE));
-                const px = Math.round(iso.x);
-                const py = Math.round(iso.y);
+                const px = ISO_TMP[0];
+                const py = ISO_TMP[1];
+
+                // Skip parks whose patch (and label) land off the world layer
+                const labeled = park.area > 2000 && zoomScale > 0.35;
+                const reach = Math.max(baseSize * 1.5, labeled ? park.name.length * fonts.parkSize / 2 : 0);
+                const rise = labeled ? baseSize + 2 + fonts.parkSize : baseSize;
+                if (px + reach < 0 || px - reach >= offscreen.width
+                    || py + baseSize < 0 || py - rise >= offscreen.height) continue;
 
                 // Dark green ground patch (diamond shape for isometric)
                 ctx.fillStyle = '#1E4D1E';
@@ -1504,107 +2185,215 @@ html = f"""<!DOCTYPE html>
                     ctx.fill();
                 }}
 
-                // Tiny trees on larger parks
+                // Tiny trees on larger parks, in 2 fills per park (see
+                // claimPixel). They're filled before the next park's patch,
+                // which still paints over them as before
                 if (baseSize > 3) {{
-                    for (let t = 0; t < Math.min(4, baseSize); t++) {{
-                        const tx = px + Math.sin(t * 2.1) * baseSize * 0.8;
-                        const ty = py + Math.cos(t * 2.1) * baseSize * 0.4;
-                        ctx.fillStyle = '#226622';
-                        ctx.fillRect(Math.round(tx), Math.round(ty) - 2, 1, 1);
-                        ctx.fillStyle = '#338833';
-                        ctx.fillRect(Math.round(tx) - 1, Math.round(ty) - 1, 3, 1);
-                        ctx.fillStyle = '#226622';
-                        ctx.fillRect(Math.round(tx), Math.round(ty), 1, 1);
+                    const treeDark = new Path2D();
+                    const treeLight = new Path2D();
+                    for (let t = Math.min(4, baseSize) - 1; t >= 0; t--) {{
+                        const tx = Math.round(px + TREE_OFFSETS[2 * t] * baseSize * 0.8);
+                        const ty = Math.round(py + TREE_OFFSETS[2 * t + 1] * baseSize * 0.4);
+                        // Last drawn first: trunk-side dot, middle row, top dot
+                        if (claimPixel(tx, ty)) treeDark.rect(tx, ty, 1, 1);
+                        for (let dx = 1; dx >= -1; dx--) {{
+                            if (claimPixel(tx + dx, ty - 1)) treeLight.rect(tx + dx, ty - 1, 1, 1);
+                        }}
+                        if (claimPixel(tx, ty - 2)) treeDark.rect(tx, ty - 2, 1, 1);
                     }}
+                    claimedPixels.clear();
+                    ctx.fillStyle = '#226622';
+                    ctx.fill(treeDark);
+                    ctx.fillStyle = '#338833';
+                    ctx.fill(treeLight);
                 }}
 
                 // Park name label (only for larger parks when zoomed in)
-                if (park.area > 2000 && (camera.zoom / PIXEL_SCALE) > 0.35) {{
-                    ctx.font = `${{Math.max(3, Math.floor(3 * camera.zoom / PIXEL_SCALE))}}px monospace`;
+                if (labeled) {{
                     ctx.fillStyle = '#66AA44';
-                    ctx.textAlign = 'center';
                     ctx.fillText(park.name, px, py - baseSize - 2);
                 }}
             }}
         }}
 
+        // === URBAN NOISE PIXEL BUFFER ===
+        // Vending machines and trees are a few single pixels each, thousands
+        // in all. Instead of a fillRect (and a fillStyle parse) per pixel,
+        // they are written straight into a transparent ImageData, which is
+        // then laid over the world in one draw. The buffer is never read back
+        // from the world layer: once ground tiles loaded from files are drawn,
+        // that canvas is tainted and getImageData would throw.
+        const noiseLayer = document.createElement('canvas');
+        const noiseLayerCtx = noiseLayer.getContext('2d');
+        let noiseImage = null;
+        let noisePixels = null;  // Uint32Array view over noiseImage's RGBA bytes
+
+        // An opaque '#RRGGBB' color as one pixel word in the platform's byte order
+        function packColor(hex) {{
+            const px = new Uint8ClampedArray([
+                parseInt(hex.slice(1, 3), 16), parseInt(hex.slice(3, 5), 16),
+                parseInt(hex.slice(5, 7), 16), 255]);
+            return new Uint32Array(px.buffer)[0];
+        }}
+
+        function beginNoisePixels() {{
+            const W = offscreen.width, H = offscreen.height;
+            if (!noiseImage || noiseImage.width !== W || noiseImage.height !== H) {{
+                noiseLayer.width = W;
+                noiseLayer.height = H;
+                noiseImage = noiseLayerCtx.createImageData(W, H);
+                noisePixels = new Uint32Array(noiseImage.data.buffer);
+            }} else {{
+                noisePixels.fill(0);
+            }}
+        }}
+
+        function plotNoise(x, y, color) {{
+            if (x >= 0 && x < noiseImage.width && y >= 0 && y < noiseImage.height) {{
+                noisePixels[y * noiseImage.width + x] = color;
+            }}
+        }}
+
+        function endNoisePixels() {{
+            noiseLayerCtx.putImageData(noiseImage, 0, 0);
+            ctx.drawImage(noiseLayer, 0, 0);
+        }}
+
         // === URBAN NOISE: Vending machines along roads ===
-        function drawVendingMachines() {{
-            if ((camera.zoom / PIXEL_SCALE) < 0.35) return;
-            const vmColors = ['#CC2222', '#2244CC', '#22AA44', '#DD8822'];
+        const VM_COLORS = ['#CC2222', '#2244CC', '#22AA44', '#DD8822'].map(packColor);
+        const VM_LIGHT = packColor('#FFFFFF');
+
+        // Machines stand beside every 3rd segment of each road, offset
+        // perpendicular to it. Roads never change, so the spots are worked
+        // out once into a flat [x0, y0, colorIndex0, x1, ...] table
+        function placeVendingMachines() {{
+            const spots = [];
             for (const road of roads) {{
                 if (road.type === 'footway' || road.type === 'path') continue;
                 const pts = road.coords;
-                for (let i = 0; i < pts.length - 1; i += 3) {{
-                    const mx = (pts[i].x + pts[i + 1].x) / 2;
-                    const my = (pts[i].y + pts[i + 1].y) / 2;
-                    const dx = pts[i + 1].x - pts[i].x;
-                    const dy = pts[i + 1].y - pts[i].y;
-                    const len = Math.sqrt(dx * dx + dy * dy);
-                    if (len < 1) continue;
+                const offset = road.width + 2;
+                const last = pts.length / 2 - 1;
+                for (let i = 0; i < last; i += 3) {{
+                    const x1 = pts[2 * i], y1 = pts[2 * i + 1];
+                    const x2 = pts[2 * i + 2], y2 = pts[2 * i + 3];
+                    const dx = x2 - x1;
+                    const dy = y2 - y1;
+                    const lenSq = dx * dx + dy * dy;
+                    if (lenSq < 1) continue;
+                    const len = Math.sqrt(lenSq);
                     // Offset perpendicular to road edge
-                    const ox = mx + (-dy / len) * (road.width + 2);
-                    const oy = my + (dx / len) * (road.width + 2);
-                    const iso = toIso(ox, oy);
-                    const color = vmColors[(i * 7) % vmColors.length];
-                    // Machine body
-                    ctx.fillStyle = color;
-                    ctx.fillRect(Math.round(iso.x), Math.round(iso.y) - 2, 1, 2);
-                    // White light panel on top
-                    ctx.fillStyle = '#FFFFFF';
-                    ctx.fillRect(Math.round(iso.x), Math.round(iso.y) - 3, 1, 1);
+                    spots.push((x1 + x2) / 2 + (-dy / len) * offset,
+                               (y1 + y2) / 2 + (dx / len) * offset,
+                               (i * 7) % VM_COLORS.length);
                 }}
             }}
+            return Float64Array.from(spots);
+        }}
+        const vendingSpots = placeVendingMachines();
+
+        function drawVendingMachines() {{
+            const {{ ax, ay, ox, oy }} = isoProj;
+            for (let k = 0; k < vendingSpots.length; k += 3) {{
+                const x = vendingSpots[k], y = vendingSpots[k + 1];
+                // toIso inlined, so no {{ x, y }} object is made per machine
+                const isoX = Math.round((x - y) * ax + ox);
+                const isoY = Math.round((x + y) * ay + oy);
+                // The machine covers isoX, from isoY - 3 down to isoY - 1
+                if (isoX < 0 || isoX >= offscreen.width || isoY < 1 || isoY - 3 >= offscreen.height) continue;
+                // Machine body
+                const color = VM_COLORS[vendingSpots[k + 2]];
+                plotNoise(isoX, isoY - 2, color);
+                plotNoise(isoX, isoY - 1, color);
+                // White light panel on top
+                plotNoise(isoX, isoY - 3, VM_LIGHT);
+            }}
         }}
 
         // === URBAN NOISE: Trees along pedestrian paths ===
+        const TREE_DARK = packColor('#336633');
+        const TREE_LIGHT = packColor('#448844');
+        const TREE_TRUNK = packColor('#554433');
+
         function drawTrees() {{
-            if ((camera.zoom / PIXEL_SCALE) < 0.35) return;
             for (const road of roads) {{
                 if (road.type !== 'pedestrian' && road.type !== 'living_street') continue;
-                const pts = road.coords;
-                for (let i = 0; i < pts.length - 1; i += 4) {{
-                    const iso = toIso(pts[i].x, pts[i].y);
-                    const tx = Math.round(iso.x);
-                    const ty = Math.round(iso.y);
+                if (offLayer(road._isoBounds, 0, 4)) continue;  // Trees stand up to 4px tall
+                const pts = isoCoords(road);
+                const n = pts.length / 2;
+                for (let i = 0; i < n - 1; i += 4) {{
+                    const tx = pts[2 * i];
+                    const ty = pts[2 * i + 1];
                     // Tree canopy (diamond shape)
-                    ctx.fillStyle = '#336633';
-                    ctx.fillRect(tx, ty - 4, 1, 1);
-                    ctx.fillStyle = '#448844';
-                    ctx.fillRect(tx - 1, ty - 3, 3, 1);
-                    ctx.fillStyle = '#336633';
-                    ctx.fillRect(tx, ty - 2, 1, 1);
+                    plotNoise(tx, ty - 4, TREE_DARK);
+                    plotNoise(tx - 1, ty - 3, TREE_LIGHT);
+                    plotNoise(tx, ty - 3, TREE_LIGHT);
+                    plotNoise(tx + 1, ty - 3, TREE_LIGHT);
+                    plotNoise(tx, ty - 2, TREE_DARK);
                     // Trunk
-                    ctx.fillStyle = '#554433';
-                    ctx.fillRect(tx, ty - 1, 1, 1);
+                    plotNoise(tx, ty - 1, TREE_TRUNK);
                 }}
             }}
         }}
 
         // === URBAN NOISE: Pedestrians on scramble crossing ===
-        function drawPedestrians() {{
-            if ((camera.zoom / PIXEL_SCALE) < 0.35) return;
-            if (scrambleArea.length < 3) return;
-            const cx = scrambleArea.reduce((s, c) => s + c.x, 0) / scrambleArea.length;
-            const cy = scrambleArea.reduce((s, c) => s + c.y, 0) / scrambleArea.length;
-            const pedColors = ['#DDDDDD', '#AAAAAA', '#997766', '#334455',
-                               '#CC8866', '#667788', '#BBAA99', '#445566'];
-            for (let p = 0; p < 40; p++) {{
+        // The crowd never moves, so the scatter around the crossing's center
+        // is worked out once into flat [x0, y0, x1, y1, ...] world positions
+        const PED_COUNT = 40;
+        const PED_COLORS = ['#DDDDDD', '#AAAAAA', '#997766', '#334455',
+                            '#CC8866', '#667788', '#BBAA99', '#445566'];
+        const pedPositions = new Float64Array(PED_COUNT * 2);
+        if (scrambleCentroid) {{
+            for (let p = 0; p < PED_COUNT; p++) {{
                 // Deterministic scatter using sin/cos hash
-                const px = cx + Math.sin(p * 2.4) * 18 + Math.cos(p * 1.7) * 12;
-                const py = cy + Math.cos(p * 3.1) * 14 + Math.sin(p * 0.9) * 10;
-                const iso = toIso(px, py);
-                // 1px body + 1px head
-                ctx.fillStyle = pedColors[p % pedColors.length];
-                ctx.fillRect(Math.round(iso.x), Math.round(iso.y) - 1, 1, 1);
-                ctx.fillStyle = '#EEDDCC';
-                ctx.fillRect(Math.round(iso.x), Math.round(iso.y) - 2, 1, 1);
+                pedPositions[2 * p] = scrambleCentroid.x + Math.sin(p * 2.4) * 18 + Math.cos(p * 1.7) * 12;
+                pedPositions[2 * p + 1] = scrambleCentroid.y + Math.cos(p * 3.1) * 14 + Math.sin(p * 0.9) * 10;
             }}
         }}
 
-        function render() {{
-            // Reset hit detection for this frame
-            buildingHitBoxes = [];
+        // A 1px body + 1px head each, batched by color (see claimPixel):
+        // one path per PED_COLORS entry plus one for the heads, so the whole
+        // crowd takes 9 fills instead of 2 per pedestrian
+        function drawPedestrians() {{
+            if (!scrambleCentroid) return;
+            const bodies = PED_COLORS.map(() => new Path2D());
+            const heads = new Path2D();
+            for (let p = PED_COUNT - 1; p >= 0; p--) {{
+                toIsoInto(pedPositions[2 * p], pedPositions[2 * p + 1], ISO_TMP);
+                const px = ISO_TMP[0], py = ISO_TMP[1];
+                // The head is drawn after the body, so it's claimed first
+                if (claimPixel(px, py - 2)) heads.rect(px, py - 2, 1, 1);
+                if (claimPixel(px, py - 1)) bodies[p % PED_COLORS.length].rect(px, py - 1, 1, 1);
+            }}
+            claimedPixels.clear();
+            for (let c = 0; c < PED_COLORS.length; c++) {{
+                ctx.fillStyle = PED_COLORS[c];
+                ctx.fill(bodies[c]);
+            }}
+            ctx.fillStyle = '#EEDDCC';
+            ctx.fill(heads);
+        }}
+
+        // What the world layer was last drawn for, and how far (in tiny
+        // pixels) the view has panned across it since
+        const worldLayer = {{ x: 0, y: 0, zoom: null, tiles: -1, viewW: 0, viewH: 0,
+                             shiftX: 0, shiftY: 0 }};
+
+        // Draw the whole world layer for the current camera
+        function renderWorld() {{
+            setIsoProjection();
+            worldLayer.x = camera.x;
+            worldLayer.y = camera.y;
+            worldLayer.zoom = camera.zoom;
+            worldLayer.tiles = gsiTilesLoaded;
+            worldLayer.viewW = viewW;
+            worldLayer.viewH = viewH;
+
+            // Reset hit detection for this layer
+            resetHitGrid();
+
+            // Every label on the map is centered; fonts only change with zoom
+            updateFonts();
+            ctx.textAlign = "center";
 
             // Clear the tiny offscreen canvas
             ctx.clearRect(0, 0, offscreen.width, offscreen.height);
@@ -1625,44 +2414,79 @@ html = f"""<!DOCTYPE html>
             // Draw roads on top of satellite (under buildings)
             drawRoads();
 
-            // Urban noise: vending machines and trees (on ground, before buildings)
-            drawVendingMachines();
-            drawTrees();
+            // Urban noise: vending machines and trees (on ground, before buildings),
+            // only once zoomed in far enough to make them out
+            if (showNoise) {{
+                beginNoisePixels();
+                drawVendingMachines();
+                drawTrees();
+                endNoisePixels();
+            }}
 
             // Draw the scramble crossing
             drawScrambleCrossing();
 
             // Pedestrians on the crossing (after crossing stripes, before buildings)
-            drawPedestrians();
-
-            // Sort: draw far buildings first (painter's algorithm)
-            const sorted = [...buildings].sort((a, b) =>
-                (a.x + a.y) - (b.x + b.y)
-            );
+            if (showNoise) drawPedestrians();
 
-            for (const b of sorted) {{
+            // Far buildings first (painter's algorithm): the build script
+            // already emitted them in that order
+            for (let b = 0; b < buildingCount; b++) {{
                 drawBuildingPoly(b);
             }}
 
-            // Draw labels for named buildings
-            for (const b of sorted) {{
-                if (b.name) drawLabel(b);
+            // Draw labels for named buildings, after all of them so that no
+            // nearer building can cover a label
+            // Pixel-perfect monospace font at small size
+            ctx.font = fonts.label;
+            ctx.fillStyle = "#dddddd";
+            for (const b of namedBuildings) {{
+                drawLabel(b);
             }}
 
             // Draw station markers (on top of everything)
             drawStations();
+        }}
+
+        // Scanline effect: a 1x3 tile with its top row darkened, repeated
+        // over the whole display in a single fill
+        const scanlineTile = document.createElement('canvas');
+        scanlineTile.width = 1;
+        scanlineTile.height = 3;
+        const scanlineTileCtx = scanlineTile.getContext('2d');
+        scanlineTileCtx.fillStyle = "rgba(0,0,0,0.06)";
+        scanlineTileCtx.fillRect(0, 0, 1, 1);
+        const scanlinePattern = displayCtx.createPattern(scanlineTile, 'repeat');
+
+        function render() {{
+            // A pan doesn't change the world, only which part of it is in
+            // view. So the world layer is only redrawn after a zoom, a resize,
+            // new ground tiles, or once a pan runs past its margin; otherwise
+            // the view is just copied from further along the layer.
+            // (whole pixels, measured between the snapped origins that
+            // setIsoProjection uses, so a slide and a redraw agree exactly)
+            let shiftX = Math.round(camera.x / PIXEL_SCALE) - Math.round(worldLayer.x / PIXEL_SCALE);
+            let shiftY = Math.round(camera.y / PIXEL_SCALE) - Math.round(worldLayer.y / PIXEL_SCALE);
+            if (worldLayer.zoom !== camera.zoom || worldLayer.tiles !== gsiTilesLoaded
+                    || worldLayer.viewW !== viewW || worldLayer.viewH !== viewH
+                    || Math.abs(shiftX) > marginX || Math.abs(shiftY) > marginY) {{
+                renderWorld();
+                shiftX = 0;
+                shiftY = 0;
+            }}
+            worldLayer.shiftX = shiftX;
+            worldLayer.shiftY = shiftY;
 
             // === THE PIXEL ART MAGIC ===
-            // Copy the tiny canvas to the big canvas with NO smoothing!
+            // Copy the view out of the tiny canvas to the big canvas with NO smoothing!
             displayCtx.imageSmoothingEnabled = false;
             displayCtx.clearRect(0, 0, canvas.width, canvas.height);
-            displayCtx.drawImage(offscreen, 0, 0, canvas.width, canvas.height);
+            displayCtx.drawImage(offscreen, marginX - shiftX, marginY - shiftY, viewW, viewH,
+                                 0, 0, canvas.width, canvas.height);
 
             // Optional: scanline effect (very subtle)
-            displayCtx.fillStyle = "rgba(0,0,0,0.06)";
-            for (let y = 0; y < canvas.height; y += 3) {{
-                displayCtx.fillRect(0, y, canvas.width, 1);
-            }}
+            displayCtx.fillStyle = scanlinePattern;
+            displayCtx.fillRect(0, 0, canvas.width, canvas.height);
 
             // Draw inspect popup on display canvas (full resolution, crisp text)
             drawInspectPopup();
@@ -1694,23 +2518,51 @@ html = f"""<!DOCTYPE html>
         }}
 
         // === INSPECT POPUP (drawn on display canvas at full resolution) ===
+        // Each font is set once per popup: the title font is left active from
+        // measuring through drawing the title, so nothing is parsed twice
+        const POPUP_FONT_TITLE = 'bold 14px monospace';
+        const POPUP_FONT_LINE = '12px monospace';
+        const POPUP_FONT_HINT = '10px monospace';
+
+        // Popup text never changes while it's open, so each (font, text)
+        // width is measured once and reused on every following frame.
+        // The caller must already have set ctx.font to the font named here.
+        // The popup fonts don't follow the zoom, and the cache only ever
+        // holds the building currently shown: it's emptied when that changes
+        const textWidthCache = new Map();
+        let textWidthCacheFor = null;
+        function cachedTextWidth(ctx, font, text) {{
+            const key = font + '|' + text;
+            let w = textWidthCache.get(key);
+            if (w === undefined) {{
+                w = ctx.measureText(text).width;
+                textWidthCache.set(key, w);
+            }}
+            return w;
+        }}
+
         function drawInspectPopup() {{
             if (!selectedBuilding) return;
             const b = selectedBuilding;
             const lines = getPopupLines(b);
+            if (textWidthCacheFor !== b) {{
+                textWidthCache.clear();
+                textWidthCacheFor = b;
+            }}
 
-            // Measure text to size the popup
-            displayCtx.font = 'bold 14px monospace';
-            const title = b.name || 'Building';
-            const titleWidth = displayCtx.measureText(title).width;
-
-            displayCtx.font = '12px monospace';
-            let maxLineW = titleWidth;
+            // Measure text to size the popup (widths are cached)
+            displayCtx.font = POPUP_FONT_LINE;
+            let maxLineW = 0;
             for (const line of lines) {{
-                const w = displayCtx.measureText(line.label + '  ' + line.value).width;
+                const w = cachedTextWidth(displayCtx, POPUP_FONT_LINE, line.label + '  ' + line.value);
                 if (w > maxLineW) maxLineW = w;
             }}
 
+            displayCtx.font = POPUP_FONT_TITLE;
+            const title = b.name || 'Building';
+            const titleWidth = cachedTextWidth(displayCtx, POPUP_FONT_TITLE, title);
+            if (titleWidth > maxLineW) maxLineW = titleWidth;
+
             const padX = 14;
             const padY = 10;
             const lineH = 18;
@@ -1733,8 +2585,7 @@ html = f"""<!DOCTYPE html>
             displayCtx.lineWidth = 1;
             displayCtx.strokeRect(boxX + 4, boxY + 4, boxW - 8, boxH - 8);
 
-            // Title
-            displayCtx.font = 'bold 14px monospace';
+            // Title (POPUP_FONT_TITLE is still set from measuring)
             displayCtx.fillStyle = '#ff7799';
             displayCtx.fillText(title, boxX + padX + 2, boxY + padY + 14);
 
@@ -1746,22 +2597,37 @@ html = f"""<!DOCTYPE html>
             displayCtx.lineTo(boxX + boxW - padX, sepY);
             displayCtx.stroke();
 
-            // Data lines
-            displayCtx.font = '12px monospace';
+            // Data lines: every label, then every value, one color each
+            displayCtx.font = POPUP_FONT_LINE;
+            displayCtx.fillStyle = '#aa99bb';
             for (let i = 0; i < lines.length; i++) {{
-                const y = sepY + 6 + (i + 1) * lineH;
-                displayCtx.fillStyle = '#aa99bb';
-                displayCtx.fillText(lines[i].label, boxX + padX + 2, y);
-                displayCtx.fillStyle = '#eeddff';
-                displayCtx.fillText(lines[i].value, boxX + padX + 90, y);
+                displayCtx.fillText(lines[i].label, boxX + padX + 2, sepY + 6 + (i + 1) * lineH);
+            }}
+            displayCtx.fillStyle = '#eeddff';
+            for (let i = 0; i < lines.length; i++) {{
+                displayCtx.fillText(lines[i].value, boxX + padX + 90, sepY + 6 + (i + 1) * lineH);
             }}
 
             // Close hint
-            displayCtx.font = '10px monospace';
+            displayCtx.font = POPUP_FONT_HINT;
             displayCtx.fillStyle = '#665577';
             displayCtx.fillText('click elsewhere to close', boxX + padX + 2, boxY + boxH - 8);
         }}
 
+        // === RENDER SCHEDULING ===
+        // mousemove and wheel can fire several times per display frame, so
+        // they only request a render; it runs once on the next animation frame
+        let renderPending = false;
+        function scheduleRender() {{
+            if (renderPending) return;
+            renderPending = true;
+            requestAnimationFrame(() => {{
+                if (!renderPending) return;  // already flushed by a click
+                renderPending = false;
+                render();
+            }});
+        }}
+
         // === PAN (drag) ===
         let dragging = false;
         let lastMouse = {{ x: 0, y: 0 }};
@@ -1778,7 +2644,8 @@ html = f"""<!DOCTYPE html>
             camera.x += e.clientX - lastMouse.x;
             camera.y += e.clientY - lastMouse.y;
             lastMouse = {{ x: e.clientX, y: e.clientY }};
-            render();
+            cameraVersion++;
+            scheduleRender();
         }});
 
         canvas.addEventListener("mouseup", (e) => {{
@@ -1788,21 +2655,19 @@ html = f"""<!DOCTYPE html>
             const dist = Math.sqrt(dx * dx + dy * dy);
 
             if (dist < 5) {{
-                // Convert display coordinates → offscreen coordinates
-                const offX = e.clientX / PIXEL_SCALE;
-                const offY = (e.clientY - 50) / PIXEL_SCALE;  // 50 = header height
-
-                // Search hit boxes in REVERSE order (topmost building drawn last)
-                let found = null;
-                for (let i = buildingHitBoxes.length - 1; i >= 0; i--) {{
-                    const hb = buildingHitBoxes[i];
-                    if (offX >= hb.minX && offX <= hb.maxX &&
-                        offY >= hb.minY && offY <= hb.maxY) {{
-                        found = hb.building;
-                        break;
-                    }}
+                // Hit testing reads worldLayer.shiftX/Y, so bring the layer
+                // up to date with any pan still waiting for its frame
+                if (renderPending) {{
+                    renderPending = false;
+                    render();
                 }}
-                selectedBuilding = found;
+
+                // Convert display coordinates → offscreen (world layer) coordinates
+                const offX = e.clientX / PIXEL_SCALE + marginX - worldLayer.shiftX;
+                const offY = (e.clientY - 50) / PIXEL_SCALE  // 50 = header height
+                           + marginY - worldLayer.shiftY;
+
+                selectedBuilding = findBuildingAt(offX, offY);
                 render();
             }}
             dragging = false;
@@ -1815,7 +2680,8 @@ html = f"""<!DOCTYPE html>
             const zoomFactor = e.deltaY > 0 ? 0.9 : 1.1;
             camera.zoom *= zoomFactor;
             camera.zoom = Math.max(0.3, Math.min(5, camera.zoom));
-            render();
+            cameraVersion++;
+            scheduleRender();
         }});
 
         // Initial render
@@ -1825,7 +2691,6 @@ html = f"""<!DOCTYPE html>
 </body>
 </html>"""
 
-output_file = "/home/kenta/coding-tutor-tutorials/shibuya_osm.html"
 with open(output_file, "w") as f:
     f.write(html)
 
@@ -1836,7 +2701,6 @@ print(f"  Open in browser: shibuya_osm.html")
 
 import webbrowser
 
-output_file = "/home/kenta/coding-tutor-tutorials/shibuya_osm.html"
 with open(output_file, "w") as f:
     f.write(html)
 